@@ -1,40 +1,95 @@
-from typing import Optional
+from typing import AsyncIterator, Mapping, Optional
+from array import array
+from collections import deque
+from dataclasses import dataclass
 import asyncio
+import hashlib
 import heapq
+import json
 import statistics
-from httpx import AsyncClient
-from uuid import uuid4
+import time
+import zlib
 
 from clients.sdg_client import SDGClient
 from clients.intab_client import IntabClient
 from clients.nats_client import NATSClient, NATSConfig
+from clients.http_client import HttpPoolConfig, build_http_client
 from infra.tokens import TokenConfig
 from infra.rate_limit import RateLimiter, RateLimiterConfig
 from domain.device import Device, Channel, ScheduleState
+from domain.schedule import MIN_TRANSMISSION_INTERVAL, LOGGER_TX_DELAY
+from domain.planner import FetchPlanner
+from domain.backfill import BackfillProgress, split_windows
+from domain.dedupe import SIGNAL_KEY, SampleDedupe
+from domain.channel_resolver import ChannelResolver
 from domain.intabcloud_telemetry_v1_pb2 import LoggerBatch, Sample, LoggerSignal, SignalType, Batch
 from utils.time import ts_now, str_to_ts
 from infra.logging_config import app_logger
+from infra.metrics import metrics
+from infra.schedule_queue import ScheduleQueue, build_schedule_queue
+from infra.circuit_breaker import CircuitBreaker, CircuitOpenError
+from infra.worker_pool import AdaptiveWorkerPool, WorkerPoolConfig, PoolSignals
+from infra.state_store import StateStore, DeviceSnapshot
+from infra.spool import Position, Spool, SpoolConfig
 import config
 
 
 class AppConfig:
-    out_queue_max = 50_000
+    # Every LoggerBatch is spooled to disk before last_seen moves past it, then replayed to NATS in order
+    publish_spool = SpoolConfig(path=config.SPOOL_DIR)
+    publish_batch_max = 200  # logger batches per NATS message
+    publish_linger_s = 2.0   # wait this long for a full message before sending a partial one
+    publish_max_in_flight = 8  # NATS messages awaiting their JetStream ack at once
     discovery_interval_s = 60
-    worker_count = 10
+    discovery_page_size = 1000  # loggers per Intab list page
+    worker_count = 10  # initial fetch workers, then autoscaled within worker_min..worker_max
+    worker_min = 2
+    worker_max = 40
+    autoscale_interval_s = 15
+    work_queue_max = 500  # scheduler stops popping from the heap while the work queue is full, 0 = unbounded
     scheduler_tick_s = 1  # fallback sleep when heap is empty
+    scheduler_max_batch = 0  # max loggers released per wakeup, 0 = every due logger
+    scheduler_backend = "heap"  # "heap" (indexed min-heap) or "wheel" (timing wheel)
+    fetch_budget_share = 0.9  # share of the SDG rate limit the scheduler may plan fetches into
+    # Separate connection pools so bulk SDG fetches don't starve Intab calls
+    sdg_http = HttpPoolConfig(max_connections=40, max_keepalive_connections=40)
+    intab_http = HttpPoolConfig(max_connections=10, max_keepalive_connections=5)
+    sample_fetch_hedge_quantile: Optional[float] = 0.95  # hedge fetches slower than this quantile, None = off
+    change_probe_interval_s = 60  # poll /devicegroups for devices with new data, 0 = off
+    backfill_threshold_s = 2 * 3600  # gaps longer than this are fetched in windows, 0 = off
+    backfill_window_s = 3600
+    backfill_concurrency = 4  # windows in flight per backfilling device
+    channel_provision_concurrency = 5  # devices provisioned at once by channel reconciliation
+    channel_reconcile_interval_s = 60  # pause between channel reconciliation passes, 0 = off
+    warmup_window_s = 300  # spread initial deadlines at startup over this window, 0 = all due at once
+    metrics_interval_s = 60
+    metrics_worst_devices = 5  # devices logged per interval with the most empty polls / longest delivery lag, 0 = off
+    state_checkpoint_interval_s = 60  # checkpoint device state for warm restarts, 0 = off
+    state_checkpoint_chunk = 1000  # devices copied per event loop slice while checkpointing
+
+# (-staleness, enqueued_at, logger_id): the device furthest behind is fetched first
+WorkItem = tuple[int, float, int]
+
+
+@dataclass
+class InFlightPublish:
+    end: Position  # spool position to ack once the message is acked
+    records: int
+    loggers: set[int]
+    task: asyncio.Task  # resolves to True once JetStream acked the message
+
 
 class Brigde:
     def __init__(self, app_cfg: AppConfig) -> None:
         self.cfg = app_cfg
-        self.http_client = AsyncClient(
-            timeout=10
-        )
+        self.sdg_http = build_http_client(self.cfg.sdg_http)
+        self.intab_http = build_http_client(self.cfg.intab_http)
 
         # Set up SDG client
         sdg_login_url = f"{config.SDG_API_BASE_URL}/users"
         self.sdg = SDGClient(
             base_url=config.SDG_API_BASE_URL,
-            http_client=self.http_client,
+            http_client=self.sdg_http,
             tkn_cfg=TokenConfig(
                 user_key=config.SDG_API_USERNAME_KEY,
                 username=config.SDG_API_USERNAME,
@@ -42,12 +97,15 @@ class Brigde:
                 login_url=sdg_login_url,
             ),
             rl_cfg=RateLimiterConfig(),
+            hedge_quantile=self.cfg.sample_fetch_hedge_quantile,
         )
+        self.planner = FetchPlanner(self.sdg.rate_limiter, share=self.cfg.fetch_budget_share)
+
         # Set up intab client
         intab_login_url = f"{config.INTAB_API_BASE_URL}/auth/token"
         self.intab = IntabClient(
             base_url=config.INTAB_API_BASE_URL,
-            http_client=self.http_client,
+            http_client=self.intab_http,
             tkn_cfg=TokenConfig(
                 user_key=config.INTAB_API_USERNAME_KEY,
                 username=config.INTAB_API_USERNAME,
@@ -56,6 +114,7 @@ class Brigde:
             ),
             rl_cfg=RateLimiterConfig()
         )
+        self.channels = ChannelResolver(self.intab)
         
         # Set up NATS
         self.nats = NATSClient(
@@ -71,104 +130,245 @@ class Brigde:
         
         self.devices: dict[int, Device] = {}
         self.unique_device_ids: set[int] = set()
+        self.device_id_by_lookup: dict[int, int] = {}  # SDG lookup_id -> logger id
+        self._record_hashes: dict[int, bytes] = {}  # logger id -> digest of its last seen Intab record
+        self._unlisted_ids: set[int] = set()  # known devices missing from the last complete listing
+
+        self._probe_ok_at = 0.0  # monotonic time of the last successful change probe
+        self._backfills: dict[int, BackfillProgress] = {}  # logger_id -> catch-up progress
 
-        self.heap: list[tuple[int, int, int]] = []  # (next_due_at, lookup_id/serial/IMEI, generation)
+        self.heap: ScheduleQueue = build_schedule_queue(self.cfg.scheduler_backend)  # logger_id keyed by next due_at
         self.heap_lock = asyncio.Lock()
+        # Set when a pushed entry is due before the scheduler's current sleep target
+        self.heap_wakeup = asyncio.Event()
+        self._scheduler_wake_at: Optional[int] = None  # None: sleeping on an empty heap
+        self.work_q_space = asyncio.Event()  # set by fetch workers when they take an item
 
-        self.publish_queue: asyncio.Queue[LoggerBatch] = asyncio.Queue(maxsize=self.cfg.out_queue_max)
+        self.spool = Spool(self.cfg.publish_spool)
+        self._nats_connect_lock = asyncio.Lock()
 
         self.stop_event = asyncio.Event()
+        self.state_store = StateStore(config.STATE_DB_PATH)
+
+        # Warm-up tracking: loggers from startup that have not completed a first fetch
+        self._warmup_pending: set[int] = set()
+        self._started_at = 0.0
+        self._in_flight = 0
+        self._queue_wait_sum = 0.0  # cumulative, read as deltas by the autoscaler
+        self._queue_wait_count = 0
+        self._spool_acked_at = (0, time.monotonic())  # (spool.acked_total, monotonic) at the last spool_stats()
 
     async def startup(self) -> None:
-        loggers = await self.intab.list_loggers()
-    
-        # initate loggers and store loggers found in intabcloud in self.loggers
-        for l in loggers:
-            device = self._initiate_logger(l)
-            # device.schedule._update_due_at()
-            self.devices[device.id] = device
-            self.unique_device_ids.add(device.id)
-
-        # populate heapqueue with due_at, logger_id, generation
+        now = ts_now()
+        self._started_at = time.monotonic()
+        # Unpublished batches from before a restart are replayed first
+        await asyncio.to_thread(self.spool.open)
+
+        snapshots: Mapping[int, DeviceSnapshot] = {}
+        if self.cfg.state_checkpoint_interval_s > 0:
+            snapshots = await asyncio.to_thread(self.state_store.load)
+        restored = 0
+
         async with self.heap_lock:
             self.heap.clear()
-            for d in self.devices.values():
-                self._push_logger_to_heap(d)
+
+        async for page in self.intab.list_loggers(page_size=self.cfg.discovery_page_size):
+            # initate loggers and store loggers found in intabcloud in self.loggers
+            page_devices = []
+            for l in page:
+                try:
+                    device = self._initiate_logger(l, self._warmup_due_at(l, now))
+                except (KeyError, ValueError) as e:
+                    app_logger.warning(f"Skipping invalid logger record for logger id: {l.get('id')}: {e}")
+                    continue
+                snapshot = snapshots.get(device.id)
+                if snapshot is not None:
+                    self._restore_device(device, l, snapshot, now)
+                    restored += 1
+                self.devices[device.id] = device
+                self.unique_device_ids.add(device.id)
+                self.device_id_by_lookup[device.lookup_id] = device.id
+                self._warmup_pending.add(device.id)
+                self._record_hashes[device.id] = self._record_hash(l)
+                page_devices.append(device)
+
+            # populate heap with logger_id keyed by due_at, page by page
+            async with self.heap_lock:
+                for d in page_devices:
+                    self._push_logger_to_heap(d)
                 
+        if snapshots:
+            app_logger.info(f"Restored state of {restored}/{len(self.devices)} devices from {self.state_store.path}")
+        self._check_fleet_budget()
         app_logger.debug(f"Startup has completed. Initiated devices: {self.devices}")
                 
     
     async def discovery_loop(self) -> None:
         while not self.stop_event.is_set():
             try:
-                loggers = await self.intab.list_loggers()
-                await self._merge_loggers(loggers)
+                await self._merge_loggers(self.intab.list_loggers(page_size=self.cfg.discovery_page_size))
             except Exception as e:
                 app_logger.error(f"Error in discovery loop: {e}")
-            
+
             try:    
                 await asyncio.wait_for(self.stop_event.wait(), timeout=self.cfg.discovery_interval_s)
             except asyncio.TimeoutError:
                 app_logger.debug("Discovery loop waiting complete.")
 
+    async def channel_reconcile_loop(self) -> None:
+        """
+        Provisions missing channels in its own loop: on a cold fleet a pass costs a
+        listing plus a few creates per device on the Intab rate limit, which would
+        otherwise hold up discovery for as long.
+        """
+        interval = self.cfg.channel_reconcile_interval_s
+        if interval <= 0:
+            return
+
+        while not self.stop_event.is_set():
+            try:
+                await self._reconcile_channels()
+            except Exception as e:
+                app_logger.error(f"Error reconciling channels: {e}")
+
+            if await self._wait_stop(interval):
+                break
+
 
     async def scheduler_loop(self) -> None:
         """
-        Pops due loggers from heap and submits them to fetch pool via a work queue.
+        Pops every due logger from the heap in one locked pass and submits them
+        to the fetch pool via a work queue, then sleeps until the next head is due.
+        Dispatches are capped by the planner's share of the SDG rate budget and by
+        free space in the bounded work queue, which is ordered by staleness.
         """
-        work_q: asyncio.Queue[int] = asyncio.Queue()
+        work_q: asyncio.PriorityQueue[WorkItem] = asyncio.PriorityQueue(maxsize=self.cfg.work_queue_max)
 
-        workers = [
-            asyncio.create_task(self.fetch_worker_loop(work_q))
-            for _ in range(self.cfg.worker_count)
-        ]
+        pool = AdaptiveWorkerPool(
+            WorkerPoolConfig(
+                initial=self.cfg.worker_count,
+                min_workers=self.cfg.worker_min,
+                max_workers=self.cfg.worker_max,
+                interval_s=self.cfg.autoscale_interval_s,
+            ),
+            spawn=lambda retire: self.fetch_worker_loop(work_q, retire),
+        )
+        autoscaler = asyncio.create_task(self.autoscaler_loop(pool, work_q))
 
         try:
             while not self.stop_event.is_set():
-                item = await self._pop_due()
-                app_logger.debug(f"Popped item: {item}")
-                if item is None:
-                    # no scheduled loggers
-                    try:
-                        await asyncio.wait_for(self.stop_event.wait(), timeout=self.cfg.scheduler_tick_s)
-                    except asyncio.TimeoutError:
-                        pass
+                budget = self.planner.budget()
+                if budget < 1:
+                    # Rate budget spent: wait for the next dispatch slot
+                    metrics.inc("planner.throttled")
+                    if await self._wait_stop(self.planner.next_slot_in()):
+                        break
+                    continue
+
+                # maxsize 0 is an unbounded asyncio queue: only the budget caps the pass
+                free = work_q.maxsize - work_q.qsize() if work_q.maxsize > 0 else budget
+                if free < 1:
+                    # Backpressure: leave due loggers in the heap until a worker frees a slot
+                    metrics.inc("work_queue.full")
+                    self.work_q_space.clear()
+                    await self._wait_event(self.work_q_space, self.cfg.scheduler_tick_s)
                     continue
 
-                due_at, logger_id = item
-                app_logger.debug(f"Extracted due_at: {due_at} for logger id: {logger_id}")
+                limit = self.cfg.scheduler_max_batch
+                limit = min(limit, budget, free) if limit else min(budget, free)
+
                 now = ts_now()
-                if due_at > now:
-                    # sleep until due or stop
-                    try:
-                        app_logger.debug(f"due at: {due_at}, now: {now}. Sleep for; {due_at - now}.")
-                        await asyncio.wait_for(self.stop_event.wait(), timeout=(due_at - now))
-                        break
-                    except asyncio.TimeoutError:
-                        pass
-                
-                app_logger.debug(f"Adding logger id: {logger_id} to work queue")
-                await work_q.put(logger_id)
+                due, next_due_at = await self._pop_due(now, limit=limit)
+                metrics.inc("scheduler.wakeups")
+
+                if due:
+                    self.planner.take(len(due))
+                    metrics.observe("scheduler.batch_size", len(due))
+                    enqueued_at = time.monotonic()
+                    for due_at, logger_id in due:
+                        metrics.observe("scheduler.dispatch_lag_s", now - due_at)
+                        staleness = now - self.devices[logger_id].schedule.last_seen
+                        work_q.put_nowait((-staleness, enqueued_at, logger_id))
+                    metrics.observe("work_queue.depth", work_q.qsize())
+                    app_logger.debug(f"Added {len(due)} logger(s) to work queue")
+
+                if next_due_at is None:
+                    # no scheduled loggers
+                    timeout = self.cfg.scheduler_tick_s
+                elif next_due_at <= now:
+                    # more loggers are due than this pass released: gates above decide the wait
+                    timeout = 0.0
+                else:
+                    timeout = max(0.0, next_due_at - time.time())
+
+                if timeout > 0:
+                    app_logger.debug(f"Next due at: {next_due_at}. Sleep for: {timeout:.2f}.")
+                if await self._wait_heap_wakeup(timeout):
+                    metrics.inc("scheduler.preempted")
 
         finally:
-            for w in workers:
-                w.cancel()
-            await asyncio.gather(*workers, return_exceptions=True)
+            autoscaler.cancel()
+            await asyncio.gather(autoscaler, return_exceptions=True)
+            await pool.close()
 
+    async def autoscaler_loop(self, pool: AdaptiveWorkerPool, work_q: asyncio.PriorityQueue[WorkItem]) -> None:
+        """
+        Periodically resizes the fetch worker pool from queue lag and SDG throttling.
+        """
+        http = self.sdg.http
+        last = (self._queue_wait_sum, self._queue_wait_count, http.throttled_responses, http.rl_wait_s)
+        metrics.set("fetch.workers", pool.size)
 
-    async def fetch_worker_loop(self, work_q: asyncio.Queue[int]) -> None:
-        while True:
-            logger_id = await work_q.get()
+        while not await self._wait_stop(pool.cfg.interval_s):
+            now = (self._queue_wait_sum, self._queue_wait_count, http.throttled_responses, http.rl_wait_s)
+            wait_sum, wait_count, throttled, rl_wait = (a - b for a, b in zip(now, last))
+            last = now
+
+            size = pool.autoscale(PoolSignals(
+                queue_wait_s=wait_sum / wait_count if wait_count else 0.0,
+                queue_depth=work_q.qsize(),
+                throttled=throttled,
+                rl_wait_s=rl_wait,
+            ))
+            metrics.set("fetch.workers", size)
+
+
+    async def fetch_worker_loop(self, work_q: asyncio.PriorityQueue[WorkItem], retire: asyncio.Event) -> None:
+        """
+        Fetches loggers from the work queue until retired by the pool (after the current item).
+        """
+        while not retire.is_set():
+            _, enqueued_at, logger_id = await work_q.get()
+            self.work_q_space.set()
+            waited = time.monotonic() - enqueued_at
+            metrics.observe("work_queue.wait_s", waited)
+            self._queue_wait_sum += waited
+            self._queue_wait_count += 1
             app_logger.debug(f"Worker got logger_id {logger_id}")
             try:
                 device = self.devices.get(logger_id)
                 if not device:
-                    app_logger.error(f"Could not extract device with logger id: {logger_id}")
+                    # Evicted by discovery after it was queued
+                    app_logger.debug(f"Skipping evicted logger id: {logger_id}")
+                    self.planner.refund(1)
                     continue
                 
                 async with device.schedule.lock:
+                    if self._probe_says_unchanged(device):
+                        # Nothing new since last_seen: keep the predicted schedule, skip the request
+                        metrics.inc("probe.skipped_fetches")
+                        self.planner.refund(1)
+                        continue
+
                     app_logger.debug(f"Calling 'fetch one' request for logger_id: {device.id}")
-                    await self._fetch_one(device)
+                    self._in_flight += 1
+                    metrics.observe("fetch.in_flight", self._in_flight)
+                    started = time.monotonic()
+                    try:
+                        await self._fetch_one(device)
+                    finally:
+                        self._in_flight -= 1
+                        metrics.observe("fetch.latency_s", time.monotonic() - started)
 
             except Exception as e:
                 app_logger.warning(f"Error during fetch worker loop: {e}")
@@ -184,13 +384,135 @@ class Brigde:
                     app_logger.debug(f"Updated due at for device: {d}")
                     await self._reschedule(d)
 
+                self._mark_warmed_up(logger_id)
                 work_q.task_done()
 
+    def _warmup_due_at(self, logger: dict, now: int) -> int:
+        """
+        Spreads initial deadlines over warmup_window_s so a restart doesn't fire one
+        fetch per device at once. Keeps a device's upload phase when last_seen is
+        known, otherwise uses a stable hash of its lookup id.
+        """
+        window = self.cfg.warmup_window_s
+        if window <= 0:
+            return now
+
+        last_seen = logger.get("last_seen")
+        if last_seen is not None:
+            offset = (int(last_seen) + LOGGER_TX_DELAY - now) % window
+        else:
+            offset = zlib.crc32(str(logger["serial_number"]).encode()) % window
+        return now + offset
+
+    def _mark_warmed_up(self, logger_id: int) -> None:
+        if not self._warmup_pending:
+            return
+        self._warmup_pending.discard(logger_id)
+        if not self._warmup_pending:
+            elapsed = time.monotonic() - self._started_at
+            metrics.set("startup.time_to_steady_state_s", round(elapsed, 1))
+            app_logger.info(f"Warm-up complete: every startup device fetched once after {elapsed:.1f}s")
+
+
+    async def change_probe_loop(self) -> None:
+        """
+        Reads every device's latest sample time from SDG device groups in one call and
+        queues a fetch right away for devices that transmitted since their last_seen.
+        Between probes, scheduled fetches for devices without new data are skipped.
+        """
+        interval = self.cfg.change_probe_interval_s
+        if interval <= 0:
+            return
+
+        while not self.stop_event.is_set():
+            try:
+                latest = await self.sdg.fetch_latest_sample_times()
+                self._probe_ok_at = time.monotonic()
+                await self._apply_probe(latest)
+            except Exception as e:
+                app_logger.warning(f"Error in change probe loop: {e}")
+                metrics.inc("probe.errors")
+
+            if await self._wait_stop(interval):
+                break
+
+    async def _apply_probe(self, latest: dict[int, int]) -> None:
+        now = ts_now()
+        changed = 0
+        async with self.heap_lock:
+            for lookup_id, ts in latest.items():
+                device = self.devices.get(self.device_id_by_lookup.get(lookup_id, -1))
+                if device is None:
+                    continue
+                device.schedule.remote_latest = ts
+                if ts <= device.schedule.last_seen:
+                    continue  # nothing new
+                if device.id not in self.heap or device.schedule.lock.locked():
+                    continue  # queued or being fetched right now, rescheduled once that is done
+                if device.schedule.due_at > now:
+                    device.schedule.due_at = now
+                    self._push_logger_to_heap(device)
+                    changed += 1
+        metrics.inc("probe.triggered_fetches", changed)
+        app_logger.debug(f"Change probe queued {changed} device(s) with new data")
+
+    def _probe_says_unchanged(self, device: Device) -> bool:
+        """
+        True if a recent change probe reported no data newer than the device's last_seen.
+        """
+        interval = self.cfg.change_probe_interval_s
+        if interval <= 0 or time.monotonic() - self._probe_ok_at > 2 * interval:
+            return False
+        remote_latest = device.schedule.remote_latest
+        return remote_latest is not None and remote_latest <= device.schedule.last_seen
 
     async def _fetch_one(self, device: Device) -> None:
-        def _extract_last_seen(samples: list) -> int:
-            first = samples[0]
-            ts = first.get("Time")
+        since = device.schedule.last_seen
+        try:
+            now = ts_now()
+            if self.cfg.backfill_threshold_s and now - since > self.cfg.backfill_threshold_s:
+                newest = await self._backfill(device, since, until=now)
+            else:
+                newest = None
+                lb = await self._fetch_batch(device, since)
+                if lb is not None:
+                    newest = lb.last_seen
+                    # add LoggerBatch to the publish spool; last_seen only moves once it is durable
+                    await self._spool_batch(lb)
+                    device.schedule.last_seen = lb.last_seen
+                    self._commit_published(device, lb)
+
+            metrics.inc("fetch.polls")
+            if device.schedule.record_poll(newest):
+                metrics.observe("fetch.delivery_lag_s", device.schedule.delivery_lag)
+            else:
+                metrics.inc("fetch.empty_polls")
+
+        except CircuitOpenError as e:
+            # Upstream-wide outage: not the device's fault
+            app_logger.debug(f"Skipped fetch for device id: {device.id}, {e}")
+            metrics.inc("fetch.circuit_open")
+            # Failed fast without a request: give the dispatch's budget slot back
+            self.planner.refund(1)
+            device.schedule.postpone(e.retry_at)
+
+        except Exception as e:
+            app_logger.warning(f"Error while fetching or extracting data from samples: {e}")
+            breaker = self._open_circuit()
+            if breaker is not None:
+                # This failure tripped (or hit) an open circuit: treat it as an outage too
+                device.schedule.postpone(breaker.retry_at())
+            else:
+                device.schedule.inc_error()
+
+
+    async def _fetch_batch(self, device: Device, since: int, until: Optional[int] = None) -> Optional[LoggerBatch]:
+        """
+        Fetches the samples from since to until (default now) into a LoggerBatch, or None if
+        there were none. Samples that were already published are dropped and counted.
+        """
+        def _extract_ts(sample: dict) -> int:
+            ts = sample.get("Time")
             if ts is None:
                 raise KeyError("Could not extract time.")
             return str_to_ts(ts)
@@ -199,97 +521,233 @@ class Brigde:
             # Add signalStrength to given list of tags
             pass
 
-        since = device.schedule.last_seen
-        try:
-            samples = await self.sdg.fetch_samples(device.lookup_id, since=since)
+        lb: Optional[LoggerBatch] = None
+        model_channel_tags = device.get_channel_tags()
+        dedupe = device.dedupe
+        duplicates = 0
+        voltages = []
 
-            if samples:
-                last_seen = _extract_last_seen(samples)
-                device.schedule.last_seen = last_seen
-                device.schedule.add_successful_tx(last_seen)
-                
-                model_channel_tags = device.get_channel_tags()
+        # Samples are decoded as the body streams in, newest first
+        async for s in self.sdg.iter_samples(device.lookup_id, since=since, until=until):
+            ts = _extract_ts(s)
+            if ts < dedupe.watermark:
+                # Re-sent because SDG's from_date is truncated to the minute
+                duplicates += sum(1 for tag in model_channel_tags if s.get(tag) is not None)
+                continue
+
+            if lb is None:
                 lb = LoggerBatch(
                     logger_id=device.id,
-                    last_seen=last_seen,
+                    last_seen=ts,
                     signal_type=SignalType.NB_IOT
                 )
+                # Once per response, and only Intab calls for tags not cached yet
+                channel_id_by_tag = await self.channels.resolve(device)
+
+            for tag in model_channel_tags:
+                channel_id = channel_id_by_tag[tag]
+
+                value = s.get(tag)
+                if value is None:
+                    app_logger.warning(f"Could not extract value from sample for device id: {device.id}")
+                    continue
+
+                if not dedupe.is_new(ts, channel_id):
+                    duplicates += 1
+                    continue
                 
-                # Extract latest values
-                # last_values, last_seen = self._extract_last_values(samples)
-                # Basically reads samples[0], possibly if len > 1, checks that its sorted DESC
-                
-                # lb.last_values = last_values
-                # lb.last_seen = last_seen
-                
-                voltages = []
-                # Iterate over json and extract values by tag
-                for s in samples:
-                    dt = s.get("Time")
-                    ts = str_to_ts(dt)
-
-                    for tag in model_channel_tags:
-                        channel_id = device.channel_id_by_tag.get(tag)
-                        
-                        if not channel_id:
-                            # This channel is probably never created. Check intab API and likely create it
-                            channel_id = await self.intab.get_channel_id_or_none(device.id, tag)
-
-                            if not channel_id:
-                                channel = await self.intab.create_channel(device.id, tag)
-                                channel_id = channel.id
-                                device.add_new_channel(channel_id, tag)  # Update Device state with new channel
-
-                        value = s.get(tag)
-                        if value is None:
-                            app_logger.warning(f"Could not extract value from sample for device id: {device.id}")
-                            continue
-                        
-                        sample = Sample(
-                            channel_id=channel_id,
-                            value=value,
-                            ts=ts
-                        )
-                        
-                        lb.samples.append(sample)
-                    
-                    v = s.get("Battery Voltage")
-                    if v:
-                        voltages.append(v)
-                    
-                    signal_value = s.get("signalStrength")
-                    if signal_value:
-                        ls = LoggerSignal(ts=ts, value=signal_value)
-                        lb.signals.append(ls)
-                
-                # Add battery voltage
-                try:
-                    v_mean = statistics.fmean(voltages)
-                    lb.battery = v_mean
-                except Exception as e:
-                    pass
+                sample = Sample(
+                    channel_id=channel_id,
+                    value=value,
+                    ts=ts
+                )
                 
-                # add LoggerBatch to out queue
-                await self.publish_queue.put(lb)
+                lb.samples.append(sample)
 
-            else:
-                device.schedule.inc_error()
+            if not dedupe.is_new(ts, SIGNAL_KEY):
+                continue
 
-        except Exception as e:
-            app_logger.warning(f"Error while fetching or extracting data from samples: {e}")
+            v = s.get("Battery Voltage")
+            if v:
+                voltages.append(v)
 
+            signal_value = s.get("signalStrength")
+            if signal_value:
+                ls = LoggerSignal(ts=ts, value=signal_value)
+                lb.signals.append(ls)
 
-    async def _pop_due(self) -> Optional[tuple[int, int]]:
-        async with self.heap_lock:
-            while self.heap:
-                due_at, logger_id, gen = heapq.heappop(self.heap)
-                logger = self.devices.get(logger_id)
-                if logger is None:
-                    continue
-                if gen != logger.schedule.generation:
-                    continue  # stale entry
-                return (due_at, logger_id)
+        if duplicates:
+            metrics.inc("fetch.duplicate_samples", duplicates)
+
+        if lb is not None and not lb.samples and not lb.signals:
+            return None  # nothing that wasn't published already
+
+        if lb is not None and voltages:
+            # Add battery voltage
+            lb.battery = statistics.fmean(voltages)
+
+        return lb
+
+    def _drop_published(self, device: Device, lb: LoggerBatch) -> Optional[LoggerBatch]:
+        """
+        Re-checks a batch against the device's current watermark. Returns None if nothing new is left.
+        """
+        dedupe = device.dedupe
+        samples = [s for s in lb.samples if dedupe.is_new(s.ts, s.channel_id)]
+        signals = [sig for sig in lb.signals if dedupe.is_new(sig.ts, SIGNAL_KEY)]
+        if not samples and not signals:
+            metrics.inc("fetch.duplicate_samples", len(lb.samples))
             return None
+
+        dropped = len(lb.samples) - len(samples)
+        if dropped or len(signals) != len(lb.signals):
+            metrics.inc("fetch.duplicate_samples", dropped)
+            del lb.samples[:]
+            lb.samples.extend(samples)
+            del lb.signals[:]
+            lb.signals.extend(signals)
+        return lb
+
+    def _commit_published(self, device: Device, lb: LoggerBatch) -> None:
+        """
+        Moves the device's dedupe watermark past a batch that was handed to the publisher.
+        """
+        keys = [(s.ts, s.channel_id) for s in lb.samples]
+        keys += [(ts, SIGNAL_KEY) for ts in {s.ts for s in lb.samples} | {sig.ts for sig in lb.signals}]
+        device.dedupe.commit(keys)
+
+    async def _backfill(self, device: Device, since: int, until: int) -> Optional[int]:
+        """
+        Catches up a large gap by fetching fixed windows concurrently (at most
+        backfill_concurrency in flight, each through the SDG rate limiter) and
+        publishing them oldest first. last_seen advances window by window, so a
+        failure leaves only the failed window and those after it for the retry.
+        Returns the newest sample time fetched, or None.
+        """
+        windows = split_windows(since, until, self.cfg.backfill_window_s)
+        progress = BackfillProgress(
+            started_from=since, target=until, committed=since, windows_total=len(windows)
+        )
+        self._backfills[device.id] = progress
+        # The dispatch paid for one request, plan the other windows into the budget too
+        self.planner.take(len(windows) - 1)
+        metrics.inc("backfill.started")
+        app_logger.info(f"Backfilling {until - since}s for device id: {device.id} in {len(windows)} windows")
+
+        upcoming = iter(windows)
+        in_flight: deque[tuple[int, asyncio.Task]] = deque()
+
+        def launch() -> None:
+            while len(in_flight) < max(1, self.cfg.backfill_concurrency):
+                window = next(upcoming, None)
+                if window is None:
+                    return
+                start, end = window
+                in_flight.append((end, asyncio.create_task(self._fetch_batch(device, start, until=end))))
+
+        newest: Optional[int] = None
+        try:
+            launch()
+
+            while in_flight:
+                end, task = in_flight.popleft()
+                lb = await task
+                if lb is not None:
+                    # Built concurrently with the previous window, which may have published the overlap
+                    lb = self._drop_published(device, lb)
+                if lb is not None:
+                    newest = max(newest or 0, lb.last_seen)
+                    await self._spool_batch(lb)
+                    self._commit_published(device, lb)
+
+                # A closed window is complete up to its end; the newest one only up to its newest sample
+                committed = end if end < until else (lb.last_seen if lb is not None else since)
+                device.schedule.last_seen = max(device.schedule.last_seen, committed)
+                progress.committed = device.schedule.last_seen
+                progress.windows_done += 1
+                metrics.inc("backfill.windows")
+                launch()
+
+            metrics.inc("backfill.completed")
+            return newest
+
+        finally:
+            unfinished = len(in_flight) + sum(1 for _ in upcoming)
+            for _, task in in_flight:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in in_flight), return_exceptions=True)
+            if unfinished:
+                self.planner.refund(unfinished)
+                metrics.inc("backfill.aborted")
+                app_logger.warning(
+                    f"Backfill for device id: {device.id} stopped at {progress.windows_done}/{progress.windows_total} windows"
+                )
+            self._backfills.pop(device.id, None)
+
+    def backfill_stats(self) -> dict[str, float]:
+        """
+        Number of devices catching up and how far behind they still are in total.
+        """
+        return {
+            "backfill.devices": len(self._backfills),
+            "backfill.behind_s": sum(p.behind_s for p in self._backfills.values()),
+        }
+
+    def poll_stats(self) -> dict[str, float]:
+        """
+        Share of the fleet's polls so far that found no new transmission.
+        """
+        polls = empty = 0
+        for d in self.devices.values():
+            polls += d.schedule.polls
+            empty += d.schedule.empty_polls
+        return {"fetch.empty_poll_ratio": round(empty / polls, 4) if polls else 0.0}
+
+    def _log_worst_devices(self, n: int) -> None:
+        """
+        Logs the n devices with the highest empty-poll ratio and the n with the longest
+        last delivery lag, i.e. those whose schedule fits their transmissions worst.
+        """
+        if n <= 0:
+            return
+        for d in heapq.nlargest(
+            n, (d for d in self.devices.values() if d.schedule.empty_polls), key=lambda d: d.schedule.empty_poll_ratio
+        ):
+            app_logger.info(
+                f"Empty polls device id: {d.id} {d.schedule.empty_poll_ratio:.0%} "
+                f"({d.schedule.empty_polls}/{d.schedule.polls} polls)"
+            )
+        for d in heapq.nlargest(
+            n, (d for d in self.devices.values() if d.schedule.delivery_lag is not None),
+            key=lambda d: d.schedule.delivery_lag,
+        ):
+            app_logger.info(f"Delivery lag device id: {d.id} {d.schedule.delivery_lag}s")
+
+    def _open_circuit(self) -> Optional[CircuitBreaker]:
+        """
+        Returns the breaker of an upstream used by fetches whose circuit is open, if any.
+        """
+        for breaker in (self.sdg.http.circuit_breaker, self.intab.http.circuit_breaker):
+            if breaker is not None and breaker.is_open:
+                return breaker
+        return None
+
+    async def _pop_due(self, now: int, limit: int = 0) -> tuple[list[tuple[int, int]], Optional[int]]:
+        """
+        Pops every logger due at or before now (at most limit, if set) under a single lock.
+        Returns the popped (due_at, logger_id) pairs and the due_at of the next head, or None if empty.
+        """
+        due: list[tuple[int, int]] = []
+        async with self.heap_lock:
+            # Pushes from here on compare against the new head
+            self.heap_wakeup.clear()
+            for due_at, logger_id in self.heap.pop_due(now, limit):
+                if logger_id not in self.devices:
+                    continue  # evicted without being removed from the heap
+                due.append((due_at, logger_id))
+            next_due_at = self.heap.next_due()
+            self._scheduler_wake_at = next_due_at
+            return due, next_due_at
         
     async def _push_back(self, logger_id: int) -> None:
         device = self.devices.get(logger_id)
@@ -300,57 +758,250 @@ class Brigde:
 
     
     async def _reschedule(self, device: Device) -> None:
-        device.schedule.generation += 1
-        
         async with self.heap_lock:
             self._push_logger_to_heap(device=device)
             app_logger.debug(f"Pushed logger_id: {device.id} to heap queue.")
 
 
-    async def _merge_loggers(self, loggers: list[dict]) -> None:
+    async def _merge_loggers(self, pages: AsyncIterator[list[dict]]) -> None:
+        """
+        Diffs discovered loggers against known devices page by page. Unchanged records
+        (same hash) cost nothing, changed ones are updated in place and new devices are
+        scheduled as soon as their page arrives. Devices missing from two complete listings
+        in a row are evicted.
+        """
         now = ts_now()
-        added = 0
+        added = changed = 0
         fetched_ids: set[int] = set()
-        for l in loggers:
-            logger_id: int = l["id"]
-            fetched_ids.add(logger_id)
-            if logger_id in self.devices:
-                continue  
-
-            # Add new loggers to loggers map
-            logger = self._initiate_logger(l, now)
-            self.devices[logger.id] = logger
-            self.unique_device_ids.add(logger_id)
-
-            app_logger.debug(f"Initated logger: {logger_id}")
-            
-            async with self.heap_lock:
-                self._push_logger_to_heap(logger)
-                app_logger.debug(f"Pushed logger id {logger_id} to heap queue.")
-            
-            added += 1
+        async for page in pages:
+            new_devices = []
+            for l in page:
+                logger_id: int = l["id"]
+                fetched_ids.add(logger_id)
+                record_hash = self._record_hash(l)
+                if self._record_hashes.get(logger_id) == record_hash:
+                    continue
+
+                try:
+                    if logger_id in self.devices:
+                        self._update_logger(self.devices[logger_id], l)
+                        changed += 1
+                    else:
+                        # Add new loggers to loggers map
+                        logger = self._initiate_logger(l, now)
+                        self.devices[logger.id] = logger
+                        self.unique_device_ids.add(logger_id)
+                        self.device_id_by_lookup[logger.lookup_id] = logger_id
+                        new_devices.append(logger)
+                        app_logger.debug(f"Initated logger: {logger_id}")
+                except (KeyError, ValueError) as e:
+                    app_logger.warning(f"Skipping invalid logger record for logger id: {logger_id}: {e}")
+                    continue
+                self._record_hashes[logger_id] = record_hash
+
+            if new_devices:
+                async with self.heap_lock:
+                    for logger in new_devices:
+                        self._push_logger_to_heap(logger)
+                app_logger.debug(f"Pushed {len(new_devices)} new logger(s) to heap queue.")
+                added += len(new_devices)
         
         # compare sets to find deactivated devices
-        deactived_ids = self.unique_device_ids.difference(fetched_ids)
-        
-        # Dont retrieve data from deactivated devices?
+        missing_ids = self.unique_device_ids.difference(fetched_ids)
+        deactived_ids: set[int] = set()
+        if missing_ids and not fetched_ids:
+            app_logger.warning(f"Discovery returned no loggers, keeping all {len(self.devices)} devices")
+        else:
+            # Offset pages are no consistent snapshot: a logger slips past a page boundary
+            # when one before it drops out between requests, so one miss is not enough
+            deactived_ids = missing_ids & self._unlisted_ids
+            self._unlisted_ids = missing_ids - deactived_ids
         if deactived_ids:
-            # delete devices from self.devices?
-            pass  
-        
-        if added:
-            print(f"Discovery loop added {added} new logger(s)")
+            await self._evict_loggers(deactived_ids)
 
+        metrics.inc("discovery.added", added)
+        metrics.inc("discovery.changed", changed)
+        metrics.inc("discovery.removed", len(deactived_ids))
+        if added or changed or deactived_ids:
+            app_logger.info(
+                f"Discovery added {added}, changed {changed} and removed {len(deactived_ids)} logger(s)"
+            )
+        if added or deactived_ids:
+            self._check_fleet_budget()
 
-    def _push_logger_to_heap(self, device: Device) -> None:
-        heapq.heappush(
-            self.heap, (
-                device.schedule.due_at,
-                device.id,  # logger_id
-                device.schedule.generation,
+    def _update_logger(self, device: Device, logger: dict) -> None:
+        """
+        Applies a changed logger record to a known device.
+        """
+        channels = self._parse_channels(logger)
+        lookup_id: int = logger["serial_number"]
+        if lookup_id != device.lookup_id and self.device_id_by_lookup.get(device.lookup_id) == device.id:
+            del self.device_id_by_lookup[device.lookup_id]
+        device.update(
+            model=logger["tag"],
+            lookup_id=lookup_id,
+            channels=channels if channels is not None else device.channels,
+        )
+        self.device_id_by_lookup[lookup_id] = device.id
+
+    async def _evict_loggers(self, logger_ids: set[int]) -> None:
+        """
+        Forgets deactivated devices and drops their pending deadlines. A fetch already
+        in flight finishes but is not rescheduled.
+        """
+        async with self.heap_lock:
+            for logger_id in logger_ids:
+                self._remove_logger_from_heap(logger_id)
+
+        for logger_id in logger_ids:
+            device = self.devices.pop(logger_id, None)
+            self.unique_device_ids.discard(logger_id)
+            self._record_hashes.pop(logger_id, None)
+            self._mark_warmed_up(logger_id)
+            if device is not None and self.device_id_by_lookup.get(device.lookup_id) == logger_id:
+                del self.device_id_by_lookup[device.lookup_id]
+            app_logger.debug(f"Evicted deactivated logger: {logger_id}")
+
+    @staticmethod
+    def _record_hash(logger: dict) -> bytes:
+        """
+        Digest of a logger record, ignoring last_seen which changes with every transmission.
+        """
+        record = {k: v for k, v in logger.items() if k != "last_seen"}
+        return hashlib.blake2b(json.dumps(record, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+    async def _reconcile_channels(self) -> None:
+        """
+        Creates channels that devices' models require but Intab doesn't have yet,
+        off the fetch path, so the first sample fetch of a device doesn't pay for it.
+        """
+        provisioned = await self.channels.provision_missing(
+            list(self.devices.values()), concurrency=self.cfg.channel_provision_concurrency
+        )
+        if provisioned:
+            app_logger.info(f"Reconciled channels for {provisioned} device(s)")
+
+    def _check_fleet_budget(self) -> None:
+        """
+        Warns when the fleet is larger than the SDG rate budget can poll at
+        the MIN_TRANSMISSION_INTERVAL cadence.
+        """
+        max_fleet = self.planner.max_fleet(MIN_TRANSMISSION_INTERVAL)
+        metrics.set("planner.fleet_size", len(self.devices))
+        metrics.set("planner.max_fleet", max_fleet)
+        if len(self.devices) > max_fleet:
+            app_logger.warning(
+                f"Fleet of {len(self.devices)} devices exceeds the {max_fleet} the SDG rate budget "
+                f"can poll every {MIN_TRANSMISSION_INTERVAL}s. Polls will lag behind schedule."
             )
+
+
+    def _push_logger_to_heap(self, device: Device) -> None:
+        """
+        Must be called with heap_lock held. Wakes the scheduler if the new entry
+        is due before the head it is currently sleeping towards.
+        """
+        due_at = device.schedule.due_at
+        self.heap.push(device.id, due_at)  # updates in place if already queued
+        if self._scheduler_wake_at is None or due_at < self._scheduler_wake_at:
+            self._scheduler_wake_at = due_at
+            self.heap_wakeup.set()
+
+    def _remove_logger_from_heap(self, logger_id: int) -> bool:
+        """
+        Must be called with heap_lock held. Drops a logger's pending deadline in O(log n).
+        """
+        return self.heap.remove(logger_id)
+
+    def heap_stats(self) -> dict[str, float]:
+        """
+        Heap size and the share of entries whose logger is no longer known.
+        """
+        size = len(self.heap)
+        stale = size - sum(1 for d in self.devices if d in self.heap)
+        return {
+            "scheduler.heap_size": size,
+            "scheduler.heap_stale_ratio": round(stale / size, 4) if size else 0.0,
+        }
+
+    def _restore_device(self, device: Device, logger: dict, snapshot: DeviceSnapshot, now: int) -> None:
+        """
+        Resumes a device from its checkpoint: exact high-water marks and the learned
+        schedule. A checkpointed deadline that is still ahead is kept; an overdue one
+        keeps the warm-up stagger.
+        """
+        state = device.schedule
+        # Without a last_seen in the record, _initiate_logger's value is a guess
+        record_last_seen = logger.get("last_seen")
+        state.last_seen = snapshot.last_seen if record_last_seen is None else max(int(record_last_seen), snapshot.last_seen)
+        state.tx_history = array("q", snapshot.tx_history[:state.history_len])
+        state.errors = snapshot.errors
+        state.misses = snapshot.misses
+        if snapshot.due_at > now:
+            state.due_at = snapshot.due_at
+        device.dedupe = SampleDedupe(watermark=max(snapshot.watermark, state.last_seen))
+
+        # Intab's record wins; checkpointed ids fill in model channels it doesn't list (yet)
+        if device.missing_channel_tags():
+            for tag, channel_id in snapshot.channel_id_by_tag().items():
+                if tag not in device.channel_id_by_tag:
+                    device.add_new_channel(channel_id, tag)
+
+    def _snapshot_device(self, device: Device) -> DeviceSnapshot:
+        state = device.schedule
+        return DeviceSnapshot(
+            id=device.id,
+            last_seen=state.last_seen,
+            due_at=state.due_at,
+            errors=state.errors,
+            misses=state.misses,
+            tx_history=array("q", state.tx_history),
+            watermark=device.dedupe.watermark,
+            channels=dict(device.channel_id_by_tag),
         )
 
+    async def state_checkpoint_loop(self) -> None:
+        """
+        Periodically checkpoints device state so a restart resumes where it left off.
+        """
+        interval = self.cfg.state_checkpoint_interval_s
+        if interval <= 0:
+            return
+        while not await self._wait_stop(interval):
+            await self._checkpoint()
+
+    async def _checkpoint(self) -> None:
+        started = time.monotonic()
+        # Copied on the loop so the writer thread never sees state mid-update, a chunk at a
+        # time: copying a large fleet in one go would stall fetches and publish acks
+        devices = list(self.devices.values())
+        chunk = max(1, self.cfg.state_checkpoint_chunk)
+        snapshots: list[DeviceSnapshot] = []
+        for i in range(0, len(devices), chunk):
+            if i:
+                await asyncio.sleep(0)
+            snapshots.extend(self._snapshot_device(d) for d in devices[i:i + chunk])
+        try:
+            # The snapshot's last_seen must never be ahead of what the spool has on disk
+            await self.spool.sync()
+            await asyncio.to_thread(self.state_store.save, snapshots)
+        except Exception as e:
+            metrics.inc("state.checkpoint_failed")
+            app_logger.error(f"Could not checkpoint device state: {e}")
+            return
+        metrics.observe("state.checkpoint_s", time.monotonic() - started)
+        app_logger.debug(f"Checkpointed state of {len(snapshots)} devices")
+
+    def _parse_channels(self, logger: dict) -> Optional[list[Channel]]:
+        """
+        Channels of an Intab logger record, or None if the record has no valid channel list.
+        """
+        logger_channels = logger.get("channels")
+        if not isinstance(logger_channels, list):
+            app_logger.error(f"Logger channels is not a list for logger id: {logger['id']}")
+            return None
+        return [Channel(id=ch["id"], tag=ch["tag"]) for ch in logger_channels]
+
     def _initiate_logger(self, logger: dict, due_at: int|None = None):
         logger_id: int = logger["id"]
         
@@ -368,19 +1019,9 @@ class Brigde:
 
         ###########
 
-        logger_channels = logger.get("channels")
-        if not isinstance(logger_channels, list):
-            app_logger.error(f"Logger channels is not a list for logger id: {logger_id}")
-            logger_channels = []
-        
-        if not logger_channels:
+        channels = self._parse_channels(logger) or []
+        if not channels:
             app_logger.debug(f"Logger channels is empty for logger id: {logger_id}")
-        
-        channels = []
-        for ch in logger_channels:
-            channel_id = ch["id"]
-            channel_tag = ch["tag"]
-            channels.append(Channel(id=channel_id, tag=channel_tag))
 
         return Device(
             id=logger_id,
@@ -393,43 +1034,207 @@ class Brigde:
             )
         )
         
+    async def _spool_batch(self, lb: LoggerBatch) -> None:
+        """
+        Appends a LoggerBatch to the publish spool. Returns once it is durable per the
+        spool's fsync policy; waits while the spool is full (NATS down for long).
+        """
+        started = time.monotonic()
+        await self.spool.append(lb.SerializeToString())
+        metrics.observe("spool.append_s", time.monotonic() - started)
+
     async def nats_publisher_loop(self) -> None:
-        buf: list[LoggerBatch] = []
-        last_flush = ts_now()
+        """
+        Replays the spool to JetStream in order, up to publish_batch_max logger batches per
+        message and up to publish_max_in_flight messages awaiting their ack. Acks may come
+        back out of order; the spool cursor only moves over the acked prefix. A failed
+        message is retried on its own with the same Nats-Msg-Id, so JetStream drops the
+        duplicate, and a message waits while one in flight carries a batch of the same
+        logger, so each logger's batches reach the stream in order.
 
-        while not self.stop_event.is_set():
-            try:
-                item = await asyncio.wait_for(self.publish_queue.get(), timeout=1.0)
-                buf.append(item)
-                self.publish_queue.task_done()
-            except asyncio.TimeoutError:
-                pass
+        Message boundaries are planned in the spool before publishing, so messages that
+        were in flight at a crash are replayed with the same records and Nats-Msg-Id.
+        JetStream drops such duplicates only within its duplicate window, though; beyond
+        that, delivery across restarts is at least once.
+        """
+        in_flight: deque[InFlightPublish] = deque()
+        next_pos = self.spool.cursor
+        lingering_since: Optional[float] = None
 
-            should_flush = len(buf) >= 200 or (ts_now() - last_flush) >= 2
-            if not should_flush or not buf:
-                continue
+        try:
+            while not self.stop_event.is_set():
+                self._ack_published(in_flight)
+                if len(in_flight) >= max(1, self.cfg.publish_max_in_flight):
+                    # Only the oldest message's ack can move the cursor and free a slot
+                    await asyncio.wait([in_flight[0].task])
+                    continue
+
+                planned = self.spool.planned_end(next_pos)
+                if planned is not None:
+                    # Planned before a restart: replay exactly that message
+                    records, end = await asyncio.to_thread(
+                        self.spool.read, self.cfg.publish_batch_max, next_pos, planned
+                    )
+                    metrics.inc("publish.replayed_messages")
+                else:
+                    records, end = await asyncio.to_thread(self.spool.read, self.cfg.publish_batch_max, next_pos)
+                    if not records:
+                        lingering_since = None
+                        await self._wait_publish_progress(in_flight, 1.0)
+                        continue
+
+                    if len(records) < self.cfg.publish_batch_max:
+                        # Give a partial message a moment to fill up
+                        lingering_since = lingering_since or time.monotonic()
+                        remaining = self.cfg.publish_linger_s - (time.monotonic() - lingering_since)
+                        if remaining > 0:
+                            await self._wait_publish_progress(in_flight, remaining)
+                            continue
+                    lingering_since = None
+                    await self.spool.plan(end)
+
+                batch_msg = Batch()
+                batch_msg.transmission_id = self.spool.record_id(next_pos, end)
+                for record in records:
+                    batch_msg.logger_batch.add().ParseFromString(record)
+                loggers = {lb.logger_id for lb in batch_msg.logger_batch}
 
-            batch_msg = Batch()
-            batch_msg.transmission_id = str(uuid4())
-            # Extend batch message with buffer list
-            batch_msg.logger_batch.extend(buf)
+                conflicts = [m.task for m in in_flight if not m.loggers.isdisjoint(loggers)]
+                if conflicts:
+                    metrics.inc("publish.ordering_waits")
+                    await asyncio.wait(conflicts)
 
+                task = asyncio.create_task(self._publish_until_acked(batch_msg))
+                in_flight.append(InFlightPublish(end=end, records=len(records), loggers=loggers, task=task))
+                metrics.observe("publish.in_flight", len(in_flight))
+                next_pos = end
+
+        finally:
+            for m in in_flight:
+                m.task.cancel()
+            await asyncio.gather(*(m.task for m in in_flight), return_exceptions=True)
+
+    async def _publish_until_acked(self, batch_msg: Batch) -> bool:
+        """
+        Publishes one message until JetStream acks it, backing off between attempts.
+        Returns False if stopped before that.
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
             try:
+                await self._ensure_nats()
                 await self.nats.publish_batch(batch_msg)
-                buf.clear()
-                last_flush = ts_now()
-            except Exception:
-                # Don't clear buf on failure; retry 
-                await asyncio.sleep(1.0)
+                metrics.observe("publish.ack_s", time.monotonic() - started)
+                return True
+            except Exception as e:
+                attempt += 1
+                metrics.inc("spool.publish_failed")
+                app_logger.warning(
+                    f"Publishing to NATS failed (attempt {attempt}), {self.spool.depth} batch(es) spooled: {e}"
+                )
+                if await self._wait_stop(min(30.0, 0.5 * 2 ** attempt)):
+                    return False
 
+    async def _ensure_nats(self) -> None:
+        if self.nats.js is not None:
+            return
+        async with self._nats_connect_lock:
+            if self.nats.js is None:
+                await self.nats.connect()
+
+    def _ack_published(self, in_flight: "deque[InFlightPublish]") -> None:
+        """
+        Acks the spool up to the last message of the acked prefix of in_flight.
+        """
+        while in_flight and in_flight[0].task.done():
+            head = in_flight[0]
+            if head.task.cancelled() or head.task.exception() is not None or not head.task.result():
+                return
+            in_flight.popleft()
+            self.spool.ack(head.end, head.records)
+            metrics.inc("spool.published", head.records)
+
+    async def _wait_publish_progress(self, in_flight: "deque[InFlightPublish]", timeout: float) -> None:
+        """
+        Waits until a batch is appended to the spool or a publish in flight completes.
+        """
+        if in_flight and in_flight[0].task.done():
+            return  # acked while the spool was read: move the cursor now, not after timeout
+        self.spool.appended.clear()
+        waiters = [m.task for m in in_flight if not m.task.done()]
+        appended = asyncio.create_task(self.spool.appended.wait())
+        try:
+            await asyncio.wait([appended, *waiters], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            appended.cancel()
+
+    def spool_stats(self) -> dict[str, float]:
+        """
+        Spool backlog and how fast it has been drained to NATS since the last call.
+        """
+        now = time.monotonic()
+        acked, at = self._spool_acked_at
+        self._spool_acked_at = (self.spool.acked_total, now)
+        return {
+            "spool.depth": self.spool.depth,
+            "spool.bytes": self.spool.pending_bytes,
+            "spool.replay_rate": round((self.spool.acked_total - acked) / (now - at), 2) if now > at else 0.0,
+        }
+
+    async def metrics_loop(self) -> None:
+        while not self.stop_event.is_set():
+            if await self._wait_stop(self.cfg.metrics_interval_s):
+                break
+            for name, value in (
+                self.heap_stats() | self.backfill_stats() | self.spool_stats() | self.poll_stats()
+            ).items():
+                metrics.set(name, value)
+            for logger_id, p in self._backfills.items():
+                app_logger.info(
+                    f"Backfill device id: {logger_id} {p.ratio:.0%} "
+                    f"({p.windows_done}/{p.windows_total} windows, {p.behind_s}s behind)"
+                )
+            self._log_worst_devices(self.cfg.metrics_worst_devices)
+            app_logger.info(f"Metrics: {metrics.snapshot(reset=True)}")
+
+    async def _wait_stop(self, timeout: float) -> bool:
+        """
+        Sleeps for timeout seconds or until stop is requested. Returns True if stopped.
+        """
+        return await self._wait_event(self.stop_event, timeout)
+
+    async def _wait_heap_wakeup(self, timeout: float) -> bool:
+        """
+        Sleeps for timeout seconds or until an earlier deadline is pushed (or stop
+        is requested). Returns True if woken before the timeout.
+        """
+        return await self._wait_event(self.heap_wakeup, timeout)
+
+    async def _wait_event(self, event: asyncio.Event, timeout: float) -> bool:
+        """
+        Waits for event for at most timeout seconds. Returns True if it was set.
+        """
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
 
     async def run(self) -> None:
         await self.startup()
 
         tasks = [
             asyncio.create_task(self.discovery_loop(), name="discovery"),
+            asyncio.create_task(self.channel_reconcile_loop(), name="channel-reconcile"),
             asyncio.create_task(self.scheduler_loop(), name="scheduler"),
             asyncio.create_task(self.nats_publisher_loop(), name="publisher"),
+            asyncio.create_task(self.spool.sync_loop(self.stop_event), name="spool-sync"),
+            asyncio.create_task(self.metrics_loop(), name="metrics"),
+            asyncio.create_task(self.change_probe_loop(), name="change-probe"),
+            asyncio.create_task(self.state_checkpoint_loop(), name="state-checkpoint"),
+            asyncio.create_task(self.sdg.token_provider.refresh_loop(), name="sdg-token"),
+            asyncio.create_task(self.intab.token_provider.refresh_loop(), name="intab-token"),
         ]
 
         app_logger.info("SDG Bridge has started successfully.")
@@ -440,7 +1245,12 @@ class Brigde:
             for t in tasks:
                 t.cancel()
             await asyncio.gather(*tasks, return_exceptions=True)
+            if self.cfg.state_checkpoint_interval_s > 0:
+                await self._checkpoint()
+            self.spool.close()
 
     async def stop(self) -> None:
         self.stop_event.set()
-        await self.http_client.aclose()
+        self.heap_wakeup.set()
+        await self.sdg_http.aclose()
+        await self.intab_http.aclose()
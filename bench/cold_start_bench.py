@@ -0,0 +1,120 @@
+"""
+Cold restart of a large fleet: time to steady state and peak load on SDG.
+
+Starts a Brigde against fake Intab and SDG clients (each sample fetch takes
+--latency seconds) and runs the scheduler until every device has been fetched
+once. Compares no warm-up (every device due at once) with the warm-up windows
+given. The SDG rate budget is lifted so the herd itself shows, not the limiter.
+
+    python -m bench.cold_start_bench [--devices 10000] [--windows 0 60] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import random
+import tempfile
+import time
+
+from app import AppConfig, Brigde
+from domain.planner import FetchPlanner
+from infra.logging_config import app_logger
+from infra.metrics import metrics
+from infra.rate_limit import RateLimiter, RateLimiterConfig
+from infra.spool import SpoolConfig
+from utils.time import ts_now, ts_to_isostr
+
+
+class FakeIntab:
+    def __init__(self, devices: int) -> None:
+        now = ts_now()
+        rng = random.Random(devices)
+        self.loggers = [
+            {
+                "id": i,
+                "tag": "IOTSU_N3_RHTEMP",
+                "serial_number": 350457791300000 + i,
+                "last_seen": now - rng.randrange(900),
+                "channels": [{"id": 2 * i + 1, "tag": "Humidity"}, {"id": 2 * i + 2, "tag": "Temperature"}],
+            }
+            for i in range(devices)
+        ]
+
+    async def list_loggers(self, page_size: int = 1000):
+        for start in range(0, len(self.loggers), page_size):
+            yield self.loggers[start:start + page_size]
+
+
+class FakeSDG:
+    """
+    Returns one new sample per fetch after `latency` seconds, recording concurrency and request rate.
+    """
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.per_second: collections.Counter[int] = collections.Counter()
+
+    async def iter_samples(self, lookup_id: int, since: int, until=None):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.per_second[int(time.monotonic())] += 1
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        yield {"Time": ts_to_isostr(ts_now()), "Humidity": 40.0, "Temperature": 21.0}
+
+
+async def run(devices: int, window: int, latency: float) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as spool_dir:
+        cfg = AppConfig()
+        cfg.warmup_window_s = window
+        cfg.state_checkpoint_interval_s = 0  # cold: no snapshot
+        cfg.publish_spool = SpoolConfig(path=spool_dir, fsync="never")
+        bridge = Brigde(cfg)
+        bridge.planner = FetchPlanner(RateLimiter(RateLimiterConfig(rate=10**6, per=1.0)))
+        bridge.intab = FakeIntab(devices)
+        sdg = FakeSDG(latency)
+        bridge.sdg = sdg
+        metrics.snapshot(reset=True)
+
+        await bridge.startup()
+        scheduler = asyncio.create_task(bridge.scheduler_loop())
+        peak_queue = 0
+        while bridge._warmup_pending:
+            await asyncio.sleep(0.1)
+            peak_queue = max(peak_queue, len(bridge._warmup_pending) - len(bridge.heap))
+        snap = metrics.snapshot(reset=True)
+
+        await bridge.stop()
+        await scheduler
+        bridge.spool.close()
+
+    return {
+        "steady_s": snap["startup.time_to_steady_state_s"],
+        "peak_in_flight": snap.get("fetch.in_flight.max", 0),
+        "peak_rps": max(sdg.per_second.values()),
+        "peak_queued": peak_queue,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 60])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake SDG fetch")
+    args = parser.parse_args()
+    app_logger.setLevel(logging.WARNING)
+
+    print(f"{'devices':>8} {'warm-up s':>9} {'steady s':>8} {'peak in-flight':>14} {'peak req/s':>10} {'peak queued':>11}")
+    for window in args.windows:
+        r = await run(args.devices, window, args.latency)
+        print(
+            f"{args.devices:>8} {window:>9} {r['steady_s']:>8.1f} {r['peak_in_flight']:>14.0f} "
+            f"{r['peak_rps']:>10} {r['peak_queued']:>11}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+Discovery time and peak memory at 50k loggers, paged against one response.
+
+Serves the Intab active-loggers listing (limit/offset) and login from a local
+stand-in HTTP server in its own process, and runs IntabClient.list_loggers
+through Brigde._merge_loggers over real HTTP. A page size of at least --loggers
+is the old single response. Each pass is timed once untraced and once under
+tracemalloc for its peak above the starting heap.
+
+    list    only reads the pages
+    first   a discovery pass into an empty fleet (every logger is new)
+    repeat  a second pass with nothing changed
+
+    python -m bench.discovery_bench [--loggers 50000] [--page-sizes 1000 50000]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable
+from urllib.parse import parse_qs, urlparse
+
+from app import AppConfig, Brigde
+from clients.intab_client import IntabClient
+from infra.logging_config import app_logger
+from infra.rate_limit import RateLimiterConfig
+from infra.tokens import TokenConfig
+from utils.time import ts_now
+
+
+LOGGERS_PATH = "/loggers/internal/active-loggers/"
+
+
+def serve(loggers: int, ready: "multiprocessing.Queue[int]") -> None:
+    now = ts_now()
+    records = [
+        json.dumps({
+            "id": i,
+            "tag": "IOTSU_N3_RHTEMP",
+            "serial_number": 350457791300000 + i,
+            "last_seen": now - i % 900,
+            "channels": [{"id": 2 * i + 1, "tag": "Humidity"}, {"id": 2 * i + 2, "tag": "Temperature"}],
+        }).encode()
+        for i in range(loggers)
+    ]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._send(b'{"access_token": "bench"}')
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path != LOGGERS_PATH:
+                self.send_error(404)
+                return
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["1000"])[0])
+            self._send(b"[" + b",".join(records[offset:offset + limit]) + b"]")
+
+        def _send(self, body: bytes) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def new_bridge(url: str) -> Brigde:
+    bridge = Brigde(AppConfig())
+    bridge.intab = IntabClient(
+        base_url=url,
+        http_client=bridge.intab_http,
+        rl_cfg=RateLimiterConfig(rate=10**6, per=1.0),
+        tkn_cfg=TokenConfig(user_key="email", username="bench", password="bench", login_url=f"{url}/login/"),
+    )
+    return bridge
+
+
+async def prepare(mode: str, url: str, page_size: int) -> tuple[Brigde, Callable[[], Awaitable[None]]]:
+    bridge = new_bridge(url)
+    await bridge.intab.token_provider.ensure_token()
+
+    async def list_only() -> None:
+        async for _ in bridge.intab.list_loggers(page_size=page_size):
+            pass
+
+    async def discover() -> None:
+        await bridge._merge_loggers(bridge.intab.list_loggers(page_size=page_size))
+
+    if mode == "repeat":
+        await discover()
+    return bridge, list_only if mode == "list" else discover
+
+
+async def run(mode: str, url: str, page_size: int) -> dict[str, float]:
+    bridge, action = await prepare(mode, url, page_size)
+    gc.collect()
+    started = time.monotonic()
+    await action()
+    elapsed = time.monotonic() - started
+    devices = len(bridge.devices)
+    await bridge.stop()
+    del bridge, action
+
+    bridge, action = await prepare(mode, url, page_size)
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    await action()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await bridge.stop()
+
+    return {"elapsed_s": elapsed, "peak_mib": (peak - base) / 2**20, "devices": devices}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loggers", type=int, default=50_000)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1000, 50_000])
+    args = parser.parse_args()
+    app_logger.setLevel(logging.ERROR)  # the fleet budget warning is expected here
+
+    ready: multiprocessing.Queue[int] = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args.loggers, ready), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{ready.get(timeout=60)}"
+
+    try:
+        print(f"{'loggers':>8} {'page size':>9} {'pass':>6} {'time s':>7} {'peak MiB':>8} {'devices':>8}")
+        for page_size in args.page_sizes:
+            for mode in ("list", "first", "repeat"):
+                r = await run(mode, url, page_size)
+                print(
+                    f"{args.loggers:>8} {page_size:>9} {mode:>6} {r['elapsed_s']:>7.2f} "
+                    f"{r['peak_mib']:>8.1f} {r['devices']:>8}"
+                )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
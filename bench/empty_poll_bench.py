@@ -0,0 +1,121 @@
+"""
+Empty-poll ratio of the fitted schedule on a simulated fleet.
+
+Each device uploads every 900, 1800 or 3600 s on a clock that runs up to --drift
+fast or slow, with uniform +-jitter seconds of timing noise per upload, and skips
+--missed of its uploads. ScheduleState is driven on a simulated clock: every poll
+sees the uploads made up to then, goes through record_poll and _update_due_at,
+and the next poll happens exactly when due. Polls during the first --warmup hours
+are not counted, while tx_history fills up.
+
+    python -m bench.empty_poll_bench [--devices 1000] [--hours 48] [--jitter 0 5 15]
+"""
+import argparse
+import heapq
+import random
+import statistics
+import time
+
+import domain.schedule
+from domain.schedule import ScheduleState
+
+
+PERIODS = (900, 1800, 3600)
+
+
+class SimClock:
+    def __init__(self, now: int) -> None:
+        self.now = now
+
+    def __call__(self) -> int:
+        return self.now
+
+
+class Uploads:
+    """
+    One device's upload times in order, of which poll() reports the newest made so far.
+    """
+    def __init__(self, rng: random.Random, start: int, args: argparse.Namespace, jitter: float) -> None:
+        self.rng = rng
+        self.period = rng.choice(PERIODS) * (1 + rng.uniform(-args.drift, args.drift))
+        self.phase = start + rng.uniform(0, self.period)
+        self.jitter = jitter
+        self.missed = args.missed
+        self.k = 0
+        self.next_at = self._at(0)
+        self.newest: int | None = None
+
+    def _at(self, k: int) -> int:
+        return int(self.phase + k * self.period + self.rng.uniform(-self.jitter, self.jitter))
+
+    def poll(self, now: int) -> int | None:
+        while self.next_at <= now:
+            if self.rng.random() >= self.missed:
+                self.newest = self.next_at
+            self.k += 1
+            self.next_at = self._at(self.k)
+        return self.newest
+
+
+def simulate(args: argparse.Namespace, jitter: float) -> dict[str, float]:
+    start = 1_790_000_000
+    clock = SimClock(start)
+    domain.schedule.ts_now = clock
+    rng = random.Random(args.devices)
+
+    devices = [(ScheduleState(last_seen=start, due_at=start), Uploads(rng, start, args, jitter)) for _ in range(args.devices)]
+    due = [(start, i) for i in range(args.devices)]
+    heapq.heapify(due)
+    counted_from = start + args.warmup * 3600
+    end = start + args.hours * 3600
+
+    polls = empty = 0
+    lags: list[int] = []
+    while due[0][0] < end:
+        clock.now, i = heapq.heappop(due)
+        state, uploads = devices[i]
+        if state.record_poll(uploads.poll(clock.now)):
+            if clock.now >= counted_from:
+                lags.append(state.delivery_lag)
+        elif clock.now >= counted_from:
+            empty += 1
+        if clock.now >= counted_from:
+            polls += 1
+        state._update_due_at()
+        heapq.heappush(due, (state.due_at, i))
+
+    lags.sort()
+    return {
+        "empty_ratio": empty / polls,
+        "lag_p50_s": lags[len(lags) // 2],
+        "lag_p95_s": lags[int(len(lags) * 0.95)],
+        "polls": polls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--hours", type=int, default=48, help="simulated time")
+    parser.add_argument("--warmup", type=int, default=12, help="hours not counted")
+    parser.add_argument("--jitter", type=float, nargs="+", default=[0, 5, 15], help="upload timing noise, +-s")
+    parser.add_argument("--drift", type=float, default=0.005, help="clock rate error, +-fraction")
+    parser.add_argument("--missed", type=float, default=0.02, help="fraction of uploads skipped")
+    args = parser.parse_args()
+
+    print(
+        f"{args.devices} devices, {args.hours - args.warmup} h counted, "
+        f"drift +-{args.drift:.1%}, {args.missed:.0%} missed uploads"
+    )
+    print(f"{'jitter s':>8} {'polls':>8} {'empty':>7} {'lag p50 s':>9} {'lag p95 s':>9} {'sim s':>6}")
+    for jitter in args.jitter:
+        started = time.monotonic()
+        r = simulate(args, jitter)
+        print(
+            f"{jitter:>8g} {r['polls']:>8} {r['empty_ratio']:>7.1%} {r['lag_p50_s']:>9} {r['lag_p95_s']:>9} "
+            f"{time.monotonic() - started:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
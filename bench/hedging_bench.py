@@ -0,0 +1,132 @@
+"""
+Hedged sample fetches against a mock SDG whose responses are slow --slow of the time.
+
+Sends --requests streamed POSTs through HttpTransport.hedged_request, --concurrency
+at a time, once without hedging and once hedging at the --quantile of recent
+latencies the way SDGClient does, and reports the latency quantiles and how many
+extra requests hedging sent. Then cancels --concurrency callers while they wait for
+their hedge delay and counts the mock requests still running afterwards.
+
+    python -m bench.hedging_bench [--requests 2000] [--slow 0.03] [--slow-s 2.0]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from clients.http_client import HttpTransport
+from clients.sdg_client import HEDGE_MIN_SAMPLES
+from infra.rate_limit import RateLimiter, RateLimiterConfig
+
+
+class MockSDG:
+    """
+    Answers after 10-30 ms, or after slow_s for a `slow` fraction of requests.
+    """
+    def __init__(self, slow: float, slow_s: float) -> None:
+        self.slow = slow
+        self.slow_s = slow_s
+        self.rng = random.Random(0)
+        self.sent = 0
+        self.running = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.sent += 1
+        self.running += 1
+        try:
+            delay = self.slow_s if self.rng.random() < self.slow else self.rng.uniform(0.01, 0.03)
+            await asyncio.sleep(delay)
+        finally:
+            self.running -= 1
+        return httpx.Response(200, json=[])
+
+
+def transport_for(sdg: MockSDG) -> HttpTransport:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(sdg.handle))
+    # Roomy enough that try_acquire never refuses a hedge; the bench measures latency, not the budget
+    return HttpTransport(client, rate_limiter=RateLimiter(RateLimiterConfig(rate=10_000, per=1.0)), name="bench")
+
+
+def hedge_delay(http: HttpTransport, quantile: Optional[float]) -> Optional[float]:
+    # SDGClient._hedge_delay
+    if quantile is None or len(http.latency) < HEDGE_MIN_SAMPLES:
+        return None
+    return http.latency.quantile(quantile)
+
+
+async def fetch(http: HttpTransport, quantile: Optional[float]) -> float:
+    started = time.monotonic()
+    r = await http.hedged_request(
+        "POST", "http://sdg.test/devices/1/data", json={}, hedge_after_s=hedge_delay(http, quantile), stream=True
+    )
+    try:
+        await r.aread()
+    finally:
+        await r.aclose()
+    return time.monotonic() - started
+
+
+async def run(args: argparse.Namespace, quantile: Optional[float]) -> dict[str, float]:
+    sdg = MockSDG(args.slow, args.slow_s)
+    http = transport_for(sdg)
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one() -> float:
+        async with slots:
+            return await fetch(http, quantile)
+
+    latencies = sorted(await asyncio.gather(*(one() for _ in range(args.requests))))
+    await http.client.aclose()
+    q = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    return {
+        "p50": q(0.50), "p95": q(0.95), "p99": q(0.99), "max": latencies[-1],
+        "extra": sdg.sent / args.requests - 1,
+    }
+
+
+async def cancelled_callers(args: argparse.Namespace) -> int:
+    """
+    Cancels callers during their hedge delay; returns the mock requests left running.
+    """
+    sdg = MockSDG(slow=1.0, slow_s=args.slow_s)
+    http = transport_for(sdg)
+    callers = [
+        asyncio.create_task(http.hedged_request("POST", "http://sdg.test/devices/1/data", hedge_after_s=1.0, stream=True))
+        for _ in range(args.concurrency)
+    ]
+    await asyncio.sleep(0.1)
+    for task in callers:
+        task.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0.1)
+    left = sdg.running
+    await http.client.aclose()
+    return left
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--slow", type=float, default=0.03, help="fraction of slow responses")
+    parser.add_argument("--slow-s", type=float, default=2.0, help="latency of a slow response")
+    parser.add_argument("--quantile", type=float, default=0.95, help="hedge after this latency quantile")
+    args = parser.parse_args()
+
+    print(f"{args.requests} fetches, {args.concurrency} concurrent, {args.slow:.0%} take {args.slow_s:g} s")
+    print(f"{'hedging':>8} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} {'max s':>6} {'extra requests':>14}")
+    for name, quantile in (("off", None), (f"p{args.quantile * 100:g}", args.quantile)):
+        r = await run(args, quantile)
+        print(
+            f"{name:>8} {r['p50']:>6.3f} {r['p95']:>6.3f} {r['p99']:>6.3f} {r['max']:>6.3f} {r['extra']:>14.1%}"
+        )
+
+    left = await cancelled_callers(args)
+    print(f"\nrequests still running after cancelling {args.concurrency} callers mid hedge delay: {left}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
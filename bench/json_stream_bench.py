@@ -0,0 +1,130 @@
+"""
+Peak RSS and CPU of decoding an SDG sample response, per 100k samples.
+
+Compares the old path (buffer the whole body, json.loads it once for the debug
+f-string and again for the samples) with iter_json_array on the stdlib splitter
+and, when installed, on ijson. Each mode runs in its own process so ru_maxrss
+only sees that mode; "source" only generates the body chunks, for reference.
+
+    python -m bench.json_stream_bench [--samples 100000] [--chunk 65536]
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import AsyncIterator, Iterator
+
+from utils import json_stream
+from utils.time import str_to_ts, ts_to_isostr
+
+
+MODES = ("source", "json.loads x2", "stream stdlib", "stream ijson")
+
+
+def body_chunks(samples: int, chunk_size: int) -> Iterator[bytes]:
+    """
+    Yields a JSON array of samples, newest first, in chunk_size pieces without building it in full.
+    """
+    start = 1_790_000_000
+    parts: list[str] = ["["]
+    size = 1
+    for i in range(samples):
+        sep = "," if i else ""
+        part = (
+            f'{sep}{{"Time":"{ts_to_isostr(start - 60 * i)}","CO2":{400 + i % 50},'
+            f'"Temperature":{20 + (i % 70) / 10},"Humidity":{35 + (i % 200) / 10}}}'
+        )
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            data = "".join(parts).encode()
+            yield data[:chunk_size]
+            parts = [data[chunk_size:].decode()]
+            size = len(parts[0])
+    parts.append("]")
+    data = "".join(parts).encode()
+    for pos in range(0, len(data), chunk_size):
+        yield data[pos:pos + chunk_size]
+
+
+async def aiter_bytes(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+def consume(sample: dict) -> float:
+    # What _fetch_one does per sample: parse the time, read the values
+    return str_to_ts(sample["Time"]) + sample["CO2"] + sample["Temperature"] + sample["Humidity"]
+
+
+async def decode(mode: str, samples: int, chunk_size: int) -> int:
+    chunks = body_chunks(samples, chunk_size)
+    count = 0
+
+    if mode == "source":
+        for _ in chunks:
+            pass
+        return samples
+
+    if mode == "json.loads x2":
+        body = b"".join(chunks)  # httpx reads the whole body before r.json()
+        debug = f"Fetched samples for device 1: {json.loads(body)}"
+        del debug
+        for sample in json.loads(body):
+            consume(sample)
+            count += 1
+        return count
+
+    if mode == "stream stdlib":
+        json_stream.ijson = None
+    async for sample in json_stream.iter_json_array(aiter_bytes(chunks)):
+        consume(sample)
+        count += 1
+    return count
+
+
+def run_one(mode: str, samples: int, chunk_size: int) -> dict:
+    if mode == "stream ijson" and json_stream.ijson is None:
+        return {"mode": mode, "skipped": "ijson not installed"}
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_started = time.process_time()
+    count = asyncio.run(decode(mode, samples, chunk_size))
+    cpu = time.process_time() - cpu_started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": mode, "count": count, "cpu_s": cpu, "peak_rss_mib": (rss_peak - rss_before) / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=100_000)
+    parser.add_argument("--chunk", type=int, default=65_536, help="bytes per body chunk, as from aiter_bytes()")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)  # one mode in this process
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_one(args.mode, args.samples, args.chunk)))
+        return
+
+    per = 100_000 / args.samples
+    print(f"{'mode':>14} {'samples':>8} {'peak RSS MiB':>12} {'cpu s':>6} {'cpu s/100k':>10}")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "bench.json_stream_bench", "--samples", str(args.samples),
+             "--chunk", str(args.chunk), "--mode", mode],
+            check=True, capture_output=True, text=True,
+        )
+        r = json.loads(out.stdout)
+        if "skipped" in r:
+            print(f"{mode:>14} {'-':>8} ({r['skipped']})")
+            continue
+        print(
+            f"{mode:>14} {r['count']:>8} {r['peak_rss_mib']:>12.1f} {r['cpu_s']:>6.2f} {r['cpu_s'] * per:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
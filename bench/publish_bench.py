@@ -0,0 +1,171 @@
+"""
+JetStream publish throughput at 1, 8 and 64 messages in flight.
+
+Fills a spool with --batches logger batches, then runs Brigde.nats_publisher_loop
+until every one is acked and reports messages, logger batches and samples per
+second. Messages sharing a logger with one in flight wait for it (--order).
+With --nats-url it publishes to that server (stream BENCH_PUBLISH,
+purged first); otherwise to a fake JetStream that acks after --ack-ms and fails
+--fail of the attempts, which also checks every batch is stored once and in
+per-logger order.
+
+    python -m bench.publish_bench [--in-flight 1 8 64] [--nats-url nats://127.0.0.1:4222]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import tempfile
+import time
+from typing import Optional
+
+from app import AppConfig, Brigde
+from clients.nats_client import NATSClient, NATSConfig
+from domain.intabcloud_telemetry_v1_pb2 import Batch, LoggerBatch
+from infra.logging_config import app_logger
+from infra.spool import SpoolConfig
+
+
+BENCH_STREAM = "BENCH_PUBLISH"
+BENCH_SUBJECT = "bench.publish"
+
+
+class UrlNATSClient(NATSClient):
+    """
+    NATSClient connecting to a plain server URL (credentials, if any, in the URL).
+    """
+    def __init__(self, url: str) -> None:
+        super().__init__(NATSConfig(
+            username="", password="", server1="", port=0, stream_name=BENCH_STREAM, subject=BENCH_SUBJECT,
+            max_reconnect_attempts=3,  # fail instead of waiting forever for a server that is not there
+        ))
+        self.url = url
+
+    def _server_url(self) -> str:
+        return self.url
+
+
+class FakeJetStream:
+    """
+    Acks a publish after a random delay, drops duplicate Nats-Msg-Ids like JetStream
+    and records the per-logger order in which batches were stored.
+    """
+    def __init__(self, ack_s: tuple[float, float], fail: float) -> None:
+        self.js = self  # connected, as far as Brigde._ensure_nats is concerned
+        self.ack_s = ack_s
+        self.fail = fail
+        self.rng = random.Random(0)
+        self.seen_ids: set[str] = set()
+        self.stored: dict[int, list[int]] = {}
+
+    async def publish_batch(self, batch: Batch) -> None:
+        await asyncio.sleep(self.rng.uniform(*self.ack_s))
+        if self.rng.random() < self.fail:
+            raise RuntimeError("fake publish failure")
+        if batch.transmission_id in self.seen_ids:
+            return
+        self.seen_ids.add(batch.transmission_id)
+        for lb in batch.logger_batch:
+            self.stored.setdefault(lb.logger_id, []).append(lb.last_seen)
+
+
+def logger_batches(count: int, loggers: int, samples: int, order: str) -> list[bytes]:
+    """
+    Serialized LoggerBatches; last_seen numbers each logger's batches 0, 1, 2, ...
+    "round-robin" spools them as polls of the fleet do, one per logger per cycle;
+    "random" picks loggers at random, so messages in flight often share a logger.
+    """
+    rng = random.Random(count)
+    per_logger = [0] * loggers
+    records = []
+    for i in range(count):
+        logger_id = i % loggers if order == "round-robin" else rng.randrange(loggers)
+        lb = LoggerBatch(logger_id=logger_id, last_seen=per_logger[logger_id])
+        per_logger[logger_id] += 1
+        for j in range(samples):
+            lb.samples.add(channel_id=j % 4, ts=1_790_000_000 + 60 * j, value=20.0 + j)
+        records.append(lb.SerializeToString())
+    return records
+
+
+async def run(in_flight: int, args: argparse.Namespace, records: list[bytes]) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as spool_dir:
+        cfg = AppConfig()
+        cfg.publish_spool = SpoolConfig(path=spool_dir, fsync="never")
+        cfg.publish_batch_max = args.batch_max
+        cfg.publish_max_in_flight = in_flight
+        cfg.publish_linger_s = 0.0  # everything is spooled up front
+        bridge = Brigde(cfg)
+        bridge.spool.open()
+        for record in records:
+            await bridge.spool.append(record)
+
+        fake: Optional[FakeJetStream] = None
+        if args.nats_url:
+            bridge.nats = UrlNATSClient(args.nats_url)
+            await bridge.nats.connect()
+            await bridge.nats.js.purge_stream(BENCH_STREAM)
+        else:
+            fake = FakeJetStream((args.ack_ms[0] / 1000, args.ack_ms[-1] / 1000), args.fail)
+            bridge.nats = fake
+
+        started = time.monotonic()
+        publisher = asyncio.create_task(bridge.nats_publisher_loop())
+        while bridge.spool.acked_total < len(records):
+            await asyncio.sleep(0.005)
+        elapsed = time.monotonic() - started
+
+        await bridge.stop()
+        await publisher
+
+        if fake is not None:
+            ok = sum(map(len, fake.stored.values())) == len(records) and all(
+                seq == list(range(len(seq))) for seq in fake.stored.values()
+            )
+            check = "once, in order" if ok else "FAILED"
+        else:
+            info = await bridge.nats.js.stream_info(BENCH_STREAM)
+            check = f"{info.state.messages} msgs stored"
+            await bridge.nats.close()
+        bridge.spool.close()
+
+    messages = -(-len(records) // args.batch_max)
+    return {
+        "messages_per_s": messages / elapsed,
+        "batches_per_s": len(records) / elapsed,
+        "samples_per_s": len(records) * args.samples / elapsed,
+        "check": check,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--nats-url", help="publish to this server instead of the fake JetStream")
+    parser.add_argument("--batches", type=int, default=3000, help="logger batches to publish")
+    parser.add_argument("--loggers", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=30, help="samples per logger batch")
+    parser.add_argument("--batch-max", type=int, default=20, help="logger batches per message")
+    parser.add_argument("--ack-ms", type=float, nargs="+", default=[10, 30], help="fake ack delay range")
+    parser.add_argument("--fail", type=float, default=0.0, help="fake publish failure rate")
+    parser.add_argument("--order", choices=["round-robin", "random"], default="round-robin")
+    args = parser.parse_args()
+    app_logger.setLevel(logging.ERROR)  # injected failures log a warning per retry
+
+    records = logger_batches(args.batches, args.loggers, args.samples, args.order)
+    target = args.nats_url or f"fake {args.ack_ms[0]:g}-{args.ack_ms[-1]:g} ms, {args.fail:.0%} fail"
+    print(
+        f"{target}: {args.batches} {args.order} logger batches of {args.loggers} loggers, "
+        f"{args.samples} samples each, {args.batch_max} per message"
+    )
+    print(f"{'in flight':>9} {'msgs/s':>8} {'batches/s':>10} {'samples/s':>10}  check")
+    for in_flight in args.in_flight:
+        r = await run(in_flight, args, records)
+        print(
+            f"{in_flight:>9} {r['messages_per_s']:>8.1f} {r['batches_per_s']:>10.0f} "
+            f"{r['samples_per_s']:>10.0f}  {r['check']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Microbenchmark of the scheduler backends (indexed heap vs timing wheel).
+
+Inserts n devices with deadlines spread uniformly over an hour, reschedules
+each of them once by a transmission interval, then sweeps the queue second by
+second until it is empty, as scheduler_loop does.
+
+    python -m bench.schedule_queue_bench [--sizes 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from domain.schedule import MAX_TRANSMISSION_INTERVAL, MIN_TRANSMISSION_INTERVAL
+from infra.schedule_queue import build_schedule_queue
+from utils.time import ts_now
+
+
+def run(backend: str, devices: int) -> dict[str, float]:
+    queue = build_schedule_queue(backend)
+    base = ts_now()
+    rng = random.Random(devices)
+    deadlines = [base + rng.randrange(MAX_TRANSMISSION_INTERVAL) for _ in range(devices)]
+
+    started = time.perf_counter()
+    for key, due_at in enumerate(deadlines):
+        queue.push(key, due_at)
+    insert = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key, due_at in enumerate(deadlines):
+        queue.push(key, due_at + MIN_TRANSMISSION_INTERVAL)
+    reschedule = time.perf_counter() - started
+
+    started = time.perf_counter()
+    popped = 0
+    now = base
+    while len(queue):
+        popped += len(queue.pop_due(now))
+        now += 1
+    sweep = time.perf_counter() - started
+    assert popped == devices
+
+    return {"insert": insert, "reschedule": reschedule, "sweep": sweep, "seconds_swept": now - base}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'devices':>8} {'backend':>7} {'insert s':>9} {'ns/op':>6} {'resched s':>9} {'ns/op':>6} {'sweep s':>8}")
+    for devices in args.sizes:
+        for backend in ("heap", "wheel"):
+            r = run(backend, devices)
+            print(
+                f"{devices:>8} {backend:>7} {r['insert']:>9.2f} {r['insert'] / devices * 1e9:>6.0f} "
+                f"{r['reschedule']:>9.2f} {r['reschedule'] / devices * 1e9:>6.0f} {r['sweep']:>8.2f}"
+            )
+    print(f"sweep = pop_due() once per second over {MAX_TRANSMISSION_INTERVAL + MIN_TRANSMISSION_INTERVAL}s until empty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Scheduler wakeups per second and dispatch lag for large fleets.
+
+Runs Brigde.scheduler_loop against fake fetch workers that only record when each
+device reached them. Every device comes due within --window seconds; the planner
+budget and the work queue are unbounded, so only the scheduler itself is measured.
+scheduler_max_batch=1 stands in for the old one-heap-item-per-wakeup loop.
+
+    python -m bench.scheduler_bench [--sizes 10000 50000 100000] [--window 10]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from app import AppConfig, Brigde
+from domain.planner import FetchPlanner
+from infra.logging_config import app_logger
+from infra.metrics import metrics
+from infra.rate_limit import RateLimiter, RateLimiterConfig
+from utils.time import ts_now
+
+
+async def run(devices: int, window: int, max_batch: int, backend: str) -> dict[str, float]:
+    cfg = AppConfig()
+    cfg.scheduler_max_batch = max_batch
+    cfg.scheduler_backend = backend
+    cfg.work_queue_max = 0
+    cfg.worker_count = cfg.worker_min = cfg.worker_max = 4
+    bridge = Brigde(cfg)
+    bridge.planner = FetchPlanner(RateLimiter(RateLimiterConfig(rate=10**9, per=1.0)))
+
+    start = ts_now() + 2
+    rng = random.Random(devices)
+    async with bridge.heap_lock:
+        for i in range(devices):
+            device = bridge._initiate_logger(
+                {"id": i, "tag": "IOTSU_N3_RHTEMP", "serial_number": i, "channels": [], "last_seen": start},
+                due_at=start + rng.randrange(window),
+            )
+            bridge.devices[i] = device
+            bridge._push_logger_to_heap(device)
+
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def fake_worker(work_q: asyncio.PriorityQueue, retire: asyncio.Event) -> None:
+        while True:
+            _, _, logger_id = await work_q.get()
+            lags.append(time.time() - bridge.devices[logger_id].schedule.due_at)
+            work_q.task_done()
+            if len(lags) == devices:
+                done.set()
+
+    bridge.fetch_worker_loop = fake_worker
+    metrics.snapshot(reset=True)
+    scheduler = asyncio.create_task(bridge.scheduler_loop())
+    # Wait for the first deadline, then measure until every device was dispatched
+    await asyncio.sleep(max(0.0, start - time.time()))
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    await asyncio.wait_for(done.wait(), timeout=window + 120)
+    elapsed = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+
+    bridge.stop_event.set()
+    await scheduler
+    await bridge.stop()
+
+    wakeups = metrics.snapshot(reset=True).get("scheduler.wakeups", 0)
+    lags.sort()
+    return {
+        "wakeups_per_s": wakeups / elapsed,
+        "lag_p50_s": lags[len(lags) // 2],
+        "lag_p99_s": lags[int(len(lags) * 0.99)],
+        "lag_max_s": lags[-1],
+        "cpu_s": cpu,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--window", type=int, default=10, help="seconds over which devices come due")
+    parser.add_argument("--backend", default="heap", choices=["heap", "wheel"])
+    args = parser.parse_args()
+    app_logger.setLevel(logging.WARNING)
+
+    print(f"{'devices':>8} {'mode':>10} {'wakeups/s':>10} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'cpu s':>6}")
+    for devices in args.sizes:
+        for mode, max_batch in (("batch", 0), ("one-by-one", 1)):
+            r = await run(devices, args.window, max_batch, args.backend)
+            print(
+                f"{devices:>8} {mode:>10} {r['wakeups_per_s']:>10.1f} {r['lag_p50_s']:>8.3f} "
+                f"{r['lag_p99_s']:>8.3f} {r['lag_max_s']:>8.3f} {r['cpu_s']:>6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+"""
+Device state checkpoint and warm restart at 100k devices.
+
+Checkpoint: copies the fleet's state on the event loop (Brigde._checkpoint) and
+writes it with StateStore.save. Reports the copy time and the longest the loop
+was blocked, once in a single slice and once in --chunk sized slices.
+
+Restart: each --repeat runs in a fresh process, as after a real restart, and
+times StateStore.load, then the snapshot lookup and _restore_device for every
+device of the listing.
+
+    python -m bench.state_restore_bench [--devices 100000] [--history 20] [--repeat 5]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from app import AppConfig, Brigde
+from infra.logging_config import app_logger
+from infra.state_store import StateStore
+from utils.time import ts_now
+
+
+def logger_records(devices: int, now: int) -> list[dict]:
+    return [
+        {
+            "id": i,
+            "tag": "IOTSU_N3_RHTEMP",
+            "serial_number": 350457791300000 + i,
+            "last_seen": now - i % 900,
+            "channels": [{"id": 2 * i + 1, "tag": "Humidity"}, {"id": 2 * i + 2, "tag": "Temperature"}],
+        }
+        for i in range(devices)
+    ]
+
+
+def polled_fleet(devices: int, history: int, now: int) -> Brigde:
+    """
+    A bridge whose devices have each been polled `history` times.
+    """
+    bridge = Brigde(AppConfig())
+    for l in logger_records(devices, now):
+        device = bridge._initiate_logger(l, now + l["id"] % 900)
+        newest = l["last_seen"]
+        device.schedule.tx_history = array("q", (newest - 900 * k for k in range(history)))
+        device.dedupe.watermark = newest
+        bridge.devices[device.id] = device
+    return bridge
+
+
+async def max_stall(action) -> tuple[float, float]:
+    """
+    Runs action() and returns (its duration, the longest gap between event loop turns meanwhile).
+    """
+    longest = 0.0
+    done = False
+
+    async def ticker() -> None:
+        nonlocal longest
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # let the ticker take its first timestamp
+    started = time.perf_counter()
+    await action()
+    elapsed = time.perf_counter() - started
+    done = True
+    await tick
+    return elapsed, longest
+
+
+async def checkpoint(args: argparse.Namespace, path: str) -> None:
+    bridge = polled_fleet(args.devices, args.history, ts_now())
+    bridge.state_store = StateStore(path)
+    bridge.spool.sync = _no_sync  # no spool is open here
+
+    print(f"{'checkpoint':>12} {'chunk':>7} {'total s':>8} {'max stall s':>11}")
+    for chunk in (args.devices, args.chunk):
+        bridge.cfg.state_checkpoint_chunk = chunk
+        gc.collect()
+        elapsed, stall = await max_stall(bridge._checkpoint)
+        print(f"{'copy + save':>12} {chunk:>7} {elapsed:>8.2f} {stall:>11.3f}")
+
+    snapshots = [bridge._snapshot_device(d) for d in bridge.devices.values()]
+    started = time.perf_counter()
+    bridge.state_store.save(snapshots)
+    print(f"{'save only':>12} {'':>7} {time.perf_counter() - started:>8.2f}")
+    await bridge.stop()
+
+
+async def _no_sync() -> None:
+    pass
+
+
+async def restart(args: argparse.Namespace, path: str) -> dict[str, float]:
+    """
+    One warm restart in this (fresh) process: load the checkpoint, then restore every
+    device of the listing the way startup() does.
+    """
+    bridge = Brigde(AppConfig())
+    now = ts_now()
+    records = logger_records(args.devices, now)
+
+    started = time.perf_counter()
+    snapshots = StateStore(path).load()
+    load_s = time.perf_counter() - started
+
+    restore_s = 0.0
+    restored = 0
+    for l in records:
+        device = bridge._initiate_logger(l, now)
+        started = time.perf_counter()
+        snapshot = snapshots.get(device.id)
+        if snapshot is not None:
+            bridge._restore_device(device, l, snapshot, now)
+            restored += 1
+        restore_s += time.perf_counter() - started
+        bridge.devices[device.id] = device
+    await bridge.stop()
+    return {"load_s": load_s, "restore_s": restore_s, "restored": restored}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=20, help="tx_history entries per device")
+    parser.add_argument("--repeat", type=int, default=5, help="warm restarts, each in a fresh process")
+    parser.add_argument("--chunk", type=int, default=AppConfig.state_checkpoint_chunk)
+    parser.add_argument("--restart-from", help=argparse.SUPPRESS)  # one restart in this process
+    args = parser.parse_args()
+    app_logger.setLevel(logging.ERROR)  # the fleet budget warning is expected here
+
+    if args.restart_from:
+        print(json.dumps(await restart(args, args.restart_from)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        print(f"{args.devices} devices, {args.history} tx_history entries each")
+        await checkpoint(args, path)
+
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.state_restore_bench", "--devices", str(args.devices),
+                 "--restart-from", path],
+                check=True, capture_output=True, text=True,
+            )
+            runs.append(json.loads(out.stdout.splitlines()[-1]))
+
+    print(f"\n{'restart':>12} {'min s':>6} {'median s':>8} {'max s':>6}  ({args.repeat} fresh processes)")
+    for name, values in (
+        ("load", [r["load_s"] for r in runs]),
+        ("restore", [r["restore_s"] for r in runs]),
+        ("total", [r["load_s"] + r["restore_s"] for r in runs]),
+    ):
+        print(f"{name:>12} {min(values):>6.2f} {statistics.median(values):>8.2f} {max(values):>6.2f}")
+    print(f"{'restored':>12} {runs[0]['restored']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
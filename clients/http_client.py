@@ -2,13 +2,61 @@ from __future__ import annotations
 
 import asyncio
 import random
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Mapping, Optional
+from typing import Any, Awaitable, Callable, Mapping, Optional
 
 import httpx
 
-from infra.rate_limit import RateLimiter
+from infra.rate_limit import RateLimiter, Priority
 from infra.tokens import TokenProvider
+from infra.metrics import metrics
+from infra.circuit_breaker import CircuitBreaker
+from infra.logging_config import app_logger
+
+
+RETRY_STATUSES = (429, 502, 503, 504)  # transient, retried from the status branch
+
+
+@dataclass(frozen=True)
+class HttpPoolConfig:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_s: float = 30.0
+    http2: bool = False  # needs the optional 'h2' package
+    connect_timeout_s: float = 5.0
+    read_timeout_s: float = 10.0
+    write_timeout_s: float = 10.0
+    pool_timeout_s: float = 10.0  # waiting for a free connection in the pool
+
+
+def build_http_client(cfg: HttpPoolConfig) -> httpx.AsyncClient:
+    """
+    Returns an AsyncClient with its own connection pool, sized and timed per cfg.
+    """
+    http2 = cfg.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            app_logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=cfg.max_connections,
+            max_keepalive_connections=cfg.max_keepalive_connections,
+            keepalive_expiry=cfg.keepalive_expiry_s,
+        ),
+        timeout=httpx.Timeout(
+            connect=cfg.connect_timeout_s,
+            read=cfg.read_timeout_s,
+            write=cfg.write_timeout_s,
+            pool=cfg.pool_timeout_s,
+        ),
+    )
 
 
 @dataclass(frozen=True)
@@ -24,6 +72,56 @@ class RetryPolicy:
         return expo + jitter
 
 
+class RetryBudget:
+    """
+    Caps retry traffic across all requests of a transport: every successful
+    request deposits `ratio` retries, plus a floor of `min_per_s` so a cold or
+    failing upstream can still be retried occasionally. Each retry withdraws one.
+    """
+    def __init__(self, ratio: float = 0.1, min_per_s: float = 0.05, max_balance: float = 10.0) -> None:
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.max_balance = max_balance
+        self._balance = max_balance
+        self._last = time.monotonic()
+
+    def on_success(self) -> None:
+        self._refill()
+        self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._balance >= 1:
+            self._balance -= 1
+            return True
+        return False
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(self.max_balance, self._balance + (now - self._last) * self.min_per_s)
+        self._last = now
+
+
+class LatencyWindow:
+    """
+    Latencies of the most recent successful requests, for quantile estimates.
+    """
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, latency_s: float) -> None:
+        self._samples.append(latency_s)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
 class HttpTransport:
     def __init__(
         self,
@@ -32,11 +130,22 @@ class HttpTransport:
         token_provider: Optional[TokenProvider] = None,
         rate_limiter: Optional[RateLimiter] = None,
         retry: RetryPolicy = RetryPolicy(),
+        retry_budget: Optional[RetryBudget] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        name: str = "http",
     ) -> None:
         self.client = client
         self.token_provider = token_provider
         self.rate_limiter = rate_limiter
         self.retry = retry
+        self.retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self.latency = LatencyWindow()
+        self.circuit_breaker = circuit_breaker
+        self.name = name  # metrics prefix
+
+        # Cumulative, read as deltas by the worker pool autoscaler
+        self.throttled_responses = 0  # 429s and responses carrying Retry-After
+        self.rl_wait_s = 0.0          # time spent waiting on the rate limiter
 
     async def request(
         self,
@@ -48,11 +157,16 @@ class HttpTransport:
         params: Optional[Mapping[str, Any]] = None,
         json: Any = None,
         timeout: Optional[float] = None,
+        priority: Priority = Priority.DEFAULT,
+        charge_rl: bool = True,
+        stream: bool = False,
     ) -> httpx.Response:
-        # Rate limit *before* attempt (and before retry)
-        if self.rate_limiter is not None:
-            await self._acquire_rl()
-
+        """
+        Sends a request with rate limiting, auth, circuit breaking and budgeted retries.
+        charge_rl=False skips the first rate limiter token (already taken by the caller).
+        stream=True returns once the headers are in; the caller reads the body
+        (e.g. resp.aiter_bytes()) and must close the response.
+        """
         # Token: explicit token wins, otherwise use provider if available
         auth_token = token
         if auth_token is None and self.token_provider is not None:
@@ -63,41 +177,73 @@ class HttpTransport:
             req_headers.setdefault("Authorization", f"Bearer {auth_token}")
 
         last_exc: Exception | None = None
+        reauthenticated = False
 
         for attempt in range(1, self.retry.max_attempts + 1):
+            # Fails fast with CircuitOpenError while the upstream is considered down,
+            # before a rate limiter token is spent on a request that is never sent
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request()
+
+            # Rate limit every attempt (retries included), unless the caller paid for the first
+            if self.rate_limiter is not None and (attempt > 1 or charge_rl):
+                await self._acquire_rl(priority)
+
+            started = time.monotonic()
             try:
-                resp = await self.client.request(
+                req = self.client.build_request(
                     method,
                     url,
                     headers=req_headers,
                     params=params,
                     json=json,
-                    timeout=timeout,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                    extensions={"trace": self._pool_trace()},
                 )
+                resp = await self.client.send(req, stream=stream)
+                if stream and resp.status_code >= 400:
+                    # Error bodies are small; read them so the connection goes back to the pool
+                    await resp.aread()
+
+                if resp.status_code == 429 or "Retry-After" in resp.headers:
+                    self.throttled_responses += 1
+                    metrics.inc(f"http.{self.name}.throttled")
+
+                # Upstream is reachable unless it answers with a gateway/unavailable error
+                self._record_outcome(ok=resp.status_code not in (500, 502, 503, 504))
 
                 # Retry on common transient statuses
-                if resp.status_code in (429, 502, 503, 504):
+                if resp.status_code in RETRY_STATUSES:
+                    if attempt >= self.retry.max_attempts or not await self._begin_retry(priority):
+                        resp.raise_for_status()
                     await self._sleep_retry(attempt, resp)
                     continue
 
                 resp.raise_for_status()
+                self.latency.add(time.monotonic() - started)
+                self.retry_budget.on_success()
                 return resp
 
             except asyncio.CancelledError:
                 raise
             except (httpx.TimeoutException, httpx.NetworkError, httpx.HTTPStatusError) as e:
                 last_exc = e
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in RETRY_STATUSES:
+                    # The status branch already spent its attempt or was refused by the budget
+                    raise
+                if not isinstance(e, httpx.HTTPStatusError):
+                    self._record_outcome(ok=False)
 
-                # If it’s a 401 and we have a provider, refresh once
+                # If it’s a 401 and the token came from the provider, re-login once
                 if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 401:
-                    if self.token_provider is not None:
-                        new_token = await self.token_provider.ensure_token()
+                    if self.token_provider is not None and token is None and not reauthenticated:
+                        reauthenticated = True
+                        auth_token = await self.token_provider.refresh_after_unauthorized(auth_token)
                         # update header with new token for next attempt
-                        req_headers["Authorization"] = f"Bearer {new_token}"
-                        await self._sleep_retry(attempt, None)
+                        req_headers["Authorization"] = f"Bearer {auth_token}"
                         continue
 
-                if attempt >= self.retry.max_attempts:
+                if attempt >= self.retry.max_attempts or not await self._begin_retry(priority):
                     raise
 
                 await self._sleep_retry(attempt, None)
@@ -106,15 +252,106 @@ class HttpTransport:
         assert last_exc is not None
         raise last_exc
 
-    async def _acquire_rl(self) -> None:
-        assert self.rate_limiter is not None
-        while True:
-            allowed, sleep_for = await self.rate_limiter.request_token()
-            if allowed:
+    async def hedged_request(self, method: str, url: str, *, hedge_after_s: Optional[float], **kwargs: Any) -> httpx.Response:
+        """
+        Like request(), but if no response has arrived after hedge_after_s a duplicate is sent
+        and the first successful response wins. The duplicate is only sent if the rate limiter
+        has a spare token right now, so hedging never queues behind or overruns the budget.
+        """
+        primary = asyncio.create_task(self.request(method, url, **kwargs))
+        if hedge_after_s is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after_s)
+        except asyncio.CancelledError:
+            # asyncio.wait leaves its tasks running when the caller is cancelled
+            primary.cancel()
+            await asyncio.gather(primary, return_exceptions=True)
+            if kwargs.get("stream"):
+                await self._close_unused(None, primary)
+            raise
+        if done:
+            return primary.result()
+        if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            return await primary
+
+        metrics.inc(f"http.{self.name}.hedged")
+        hedge = asyncio.create_task(self.request(method, url, charge_rl=False, **kwargs))
+        pending = {primary, hedge}
+        winner: Optional[asyncio.Task] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.inc(f"http.{self.name}.hedge_won")
+                        winner = task
+                        return task.result()
+            # Both failed: surface the primary's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if kwargs.get("stream"):
+                await self._close_unused(winner, primary, hedge)
+
+    async def _close_unused(self, winner: Optional[asyncio.Task], *tasks: asyncio.Task) -> None:
+        """
+        Closes streamed responses of hedged requests that completed but were not used.
+        """
+        for task in tasks:
+            if task is not winner and task.done() and not task.cancelled() and task.exception() is None:
+                await task.result().aclose()
+
+    async def _begin_retry(self, priority: Priority) -> bool:
+        """
+        Charges a retry to the retry budget; its rate limiter token is taken when it is
+        sent. Returns False when the budget is exhausted and the request should fail instead.
+        """
+        if not self.retry_budget.try_withdraw():
+            metrics.inc(f"http.{self.name}.retry_budget_exhausted")
+            return False
+        metrics.inc(f"http.{self.name}.retries")
+        return True
+
+    def _pool_trace(self) -> Callable[[str, dict], Awaitable[None]]:
+        """
+        httpcore trace hook measuring how long a request waited for a pooled connection
+        and whether it reused one or had to open a new one.
+        """
+        started = time.monotonic()
+        seen = False
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal seen
+            if seen:
                 return
-            if sleep_for is None:
-                raise RuntimeError("Rate limiter denied without a sleep suggestion")
-            await asyncio.sleep(sleep_for)
+            new_conn = event_name == "connection.connect_tcp.started"
+            if new_conn or event_name.endswith(".send_request_headers.started"):
+                seen = True
+                metrics.observe(f"http.{self.name}.pool_wait_s", time.monotonic() - started)
+                metrics.inc(f"http.{self.name}.conn_new" if new_conn else f"http.{self.name}.conn_reused")
+
+        return trace
+
+    def _record_outcome(self, ok: bool) -> None:
+        if self.circuit_breaker is None:
+            return
+        if ok:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+    async def _acquire_rl(self, priority: Priority) -> None:
+        assert self.rate_limiter is not None
+        started = time.monotonic()
+        await self.rate_limiter.acquire(priority=priority)
+        waited = time.monotonic() - started
+        self.rl_wait_s += waited
+        metrics.observe(f"http.{self.name}.rl_wait_s", waited)
 
     async def _sleep_retry(self, attempt: int, resp: Optional[httpx.Response]) -> None:
         # Prefer Retry-After if present
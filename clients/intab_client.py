@@ -1,9 +1,12 @@
 
+from typing import AsyncIterator
+
 from httpx import AsyncClient
 
 from infra.tokens import TokenProvider, TokenConfig
-from infra.rate_limit import RateLimiter, RateLimiterConfig
+from infra.rate_limit import RateLimiter, RateLimiterConfig, Priority
 from clients.http_client import HttpTransport
+from infra.circuit_breaker import CircuitBreaker, CircuitBreakerConfig
 from domain.device import Channel
 from infra.logging_config import app_logger
 
@@ -15,33 +18,55 @@ class IntabClient:
         http_client: AsyncClient,
         rl_cfg: RateLimiterConfig,
         tkn_cfg: TokenConfig,
+        cb_cfg: CircuitBreakerConfig = CircuitBreakerConfig(),
     ) -> None:
         
         self.base_url = base_url
         self.rate_limiter = RateLimiter(cfg=rl_cfg)
         self.token_provider = TokenProvider(
             cfg=tkn_cfg,
-            http_client=http_client
+            http_client=http_client,
+            rate_limiter=self.rate_limiter,
+            name="intab",
         )
         self.http = HttpTransport(
             client = http_client,
             token_provider=self.token_provider,
             rate_limiter=self.rate_limiter,
+            circuit_breaker=CircuitBreaker(name="intab", cfg=cb_cfg),
+            name="intab",
         )
 
-    async def list_loggers(self) -> list:
+    async def list_loggers(self, page_size: int = 1000) -> AsyncIterator[list[dict]]:
+        """
+        Yields the active SDG loggers one page at a time, until a short page marks the end.
+        Stops early if a page repeats the previous one, e.g. if the API ignores the offset.
+        """
         url = f"{self.base_url}/loggers/internal/active-loggers/"
-        params = {
-            "manufacturer": "SDG",
-            "incl_children": True,
-            "limit": 1000,
-        }
-        app_logger.debug(f"Trying to fetch logger list from: {url}, with params: {params}")
-        r = await self.http.request(method="GET",url=url,params=params)
-
-        app_logger.debug(f"Fetched list of loggers: {r.json()}")
-
-        return r.json()
+        offset = 0
+        previous_ids: list = []
+        while True:
+            params = {
+                "manufacturer": "SDG",
+                "incl_children": True,
+                "limit": page_size,
+                "offset": offset,
+            }
+            app_logger.debug(f"Trying to fetch logger list from: {url}, with params: {params}")
+            r = await self.http.request(method="GET",url=url,params=params, priority=Priority.DISCOVERY)
+
+            page = r.json()
+            app_logger.debug(f"Fetched page of {len(page)} loggers at offset {offset}")
+            page_ids = [l.get("id") for l in page]
+            if page and page_ids == previous_ids:
+                app_logger.warning(f"Logger list page at offset {offset} repeats the previous page, stopping")
+                return
+            previous_ids = page_ids
+            yield page
+
+            if len(page) < page_size:
+                return
+            offset += len(page)
     
     
     async def list_logger_channels(self, logger_id: int) -> list:
@@ -1,10 +1,22 @@
+from typing import Any, AsyncIterator, Optional
+
 from httpx import AsyncClient
 
 from infra.tokens import TokenProvider, TokenConfig
-from infra.rate_limit import RateLimiterConfig, RateLimiter
+from infra.rate_limit import RateLimiterConfig, RateLimiter, Priority
 from clients.http_client import HttpTransport
+from infra.circuit_breaker import CircuitBreaker, CircuitBreakerConfig
 from infra.logging_config import app_logger
-from utils.time import ts_to_isostr, dt_now_isostr, sdg_time_to_str
+from utils.time import ts_to_isostr, dt_now_isostr, sdg_time_to_str, str_to_ts
+from utils.json_stream import iter_json_array
+
+
+HEDGE_MIN_SAMPLES = 20  # successful requests needed before the latency quantile is trusted
+
+# /devicegroups: each group lists its devices with their latest payload
+GROUP_DEVICES_KEYS = ("devices",)
+DEVICE_ID_KEYS = ("id", "serial", "imei")
+DEVICE_PAYLOAD_KEYS = ("latest_payload", "latestPayload", "payload")
 
 
 class SDGClient:
@@ -13,28 +25,37 @@ class SDGClient:
         base_url: str, 
         http_client: AsyncClient,
         tkn_cfg: TokenConfig, 
-        rl_cfg: RateLimiterConfig
+        rl_cfg: RateLimiterConfig,
+        cb_cfg: CircuitBreakerConfig = CircuitBreakerConfig(),
+        hedge_quantile: Optional[float] = None,
     ) -> None:
         
         self.base_url = base_url
+        # Hedge sample fetches slower than this latency quantile (None disables hedging)
+        self.hedge_quantile = hedge_quantile
         self.rate_limiter = RateLimiter(cfg=rl_cfg)
         self.token_provider = TokenProvider(
             cfg=tkn_cfg,
-            http_client=http_client
+            http_client=http_client,
+            rate_limiter=self.rate_limiter,
+            name="sdg",
         )
         self.http = HttpTransport(
             client=http_client,
             token_provider=self.token_provider,
             rate_limiter=self.rate_limiter,
+            circuit_breaker=CircuitBreaker(name="sdg", cfg=cb_cfg),
+            name="sdg",
         )
 
 
-    async def fetch_samples(self, lookup_id: int, since: int) -> list:
+    async def iter_samples(self, lookup_id: int, since: int, until: Optional[int] = None) -> AsyncIterator[dict[str, Any]]:
         """
-        Returns a list of samples and the loggers last_seen (the latest sample time)
+        Yields the samples from `since` to `until` (default now), newest first, while the
+        response body is still arriving; the body is decoded once and never held in full.
         """
         from_date = sdg_time_to_str(ts=since)
-        now = sdg_time_to_str()
+        now = sdg_time_to_str(ts=until)
         url = f"{self.base_url}/devices/{lookup_id}/data"
 
         payload = {
@@ -43,9 +64,50 @@ class SDGClient:
         }
         app_logger.debug(f"Trying to call url: {url} using payload: {payload}")
 
-        r = await self.http.request("POST", url, json=payload)
+        r = await self.http.hedged_request(
+            "POST", url, json=payload, priority=Priority.BULK, hedge_after_s=self._hedge_delay(), stream=True
+        )
+        try:
+            count = 0
+            async for sample in iter_json_array(r.aiter_bytes()):
+                count += 1
+                yield sample
+            app_logger.debug(f"Fetched {count} samples for device {lookup_id}")
+        finally:
+            await r.aclose()
+
+    async def fetch_latest_sample_times(self) -> dict[int, int]:
+        """
+        One call for the whole fleet: returns the latest sample time per lookup_id,
+        taken from the latest payload /devicegroups reports for each device.
+        """
+        url = f"{self.base_url}/devicegroups"
+        r = await self.http.request("GET", url, priority=Priority.DISCOVERY)
+
+        latest: dict[int, int] = {}
+        for group in r.json():
+            for device in self._first_of(group, GROUP_DEVICES_KEYS) or []:
+                lookup_id = self._first_of(device, DEVICE_ID_KEYS)
+                payload = self._first_of(device, DEVICE_PAYLOAD_KEYS)
+                if lookup_id is None or not isinstance(payload, dict) or not payload.get("Time"):
+                    continue
+                try:
+                    ts = str_to_ts(payload["Time"])
+                    lookup_id = int(lookup_id)
+                except (TypeError, ValueError):
+                    continue
+                latest[lookup_id] = max(ts, latest.get(lookup_id, 0))
 
-        app_logger.debug(f"Fetched samples for device {lookup_id}: {r.json()}")        
+        app_logger.debug(f"Fetched latest sample times for {len(latest)} devices from device groups")
+        return latest
 
-        return r.json()
-        
+    def _first_of(self, obj: dict, keys: tuple[str, ...]):
+        for key in keys:
+            if key in obj:
+                return obj[key]
+        return None
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_quantile is None or len(self.http.latency) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.http.latency.quantile(self.hedge_quantile)
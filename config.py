@@ -19,3 +19,6 @@ NATS_SERVER1 = os.getenv("NATS_SERVER1", "nats")
 NATS_PORT = os.getenv("NATS_PORT", 4222)
 NATS_STREAM_NAME = os.getenv("NATS_STREAM_NAME", "SAMPLES")
 NATS_SUBJECT = os.getenv("NATS_SUBJECT", "telemetry.v1")
+
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state/bridge_state.sqlite3")
+SPOOL_DIR = os.getenv("SPOOL_DIR", "state/spool")
@@ -0,0 +1,38 @@
+from dataclasses import dataclass, field
+
+from utils.time import ts_now
+
+
+def split_windows(since: int, until: int, window_s: int) -> list[tuple[int, int]]:
+    """
+    Splits since..until into consecutive (from, to) windows of at most window_s seconds, oldest first.
+    """
+    windows = []
+    start = since
+    while start < until:
+        end = min(until, start + window_s)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
+@dataclass
+class BackfillProgress:
+    """
+    Catch-up state of one device whose gap is fetched window by window.
+    """
+    started_from: int  # last_seen when the backfill began
+    target: int        # end of the newest window
+    committed: int     # everything up to here has been published
+    windows_total: int
+    windows_done: int = 0
+    started_at: int = field(default_factory=ts_now)
+
+    @property
+    def ratio(self) -> float:
+        span = self.target - self.started_from
+        return (self.committed - self.started_from) / span if span > 0 else 1.0
+
+    @property
+    def behind_s(self) -> int:
+        return max(0, self.target - self.committed)
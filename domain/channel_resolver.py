@@ -0,0 +1,86 @@
+import asyncio
+from typing import Iterable
+
+from clients.intab_client import IntabClient
+from domain.device import Device
+from infra.logging_config import app_logger
+from infra.metrics import metrics
+
+
+class ChannelResolver:
+    """
+    Resolves a device's channel ids by tag, caching them on the device.
+
+    Missing tags cost one channel listing per device plus one create per tag
+    that does not exist in Intab yet, however many samples are being mapped.
+    Resolution is single-flight per (logger_id, tag): concurrent callers wait
+    for the request already in flight instead of listing or creating again.
+    """
+    def __init__(self, intab: IntabClient) -> None:
+        self.intab = intab
+        self._in_flight: dict[tuple[int, str], asyncio.Task] = {}
+
+    async def resolve(self, device: Device) -> dict[str, int]:
+        """
+        Returns the device's channel_id_by_tag with every tag of its model resolved.
+        """
+        missing = device.missing_channel_tags()
+        if not missing:
+            return device.channel_id_by_tag
+
+        tasks = {self._in_flight[(device.id, tag)] for tag in missing if (device.id, tag) in self._in_flight}
+        unclaimed = [tag for tag in missing if (device.id, tag) not in self._in_flight]
+        if unclaimed:
+            task = asyncio.create_task(self._provision(device, unclaimed))
+            for tag in unclaimed:
+                self._in_flight[(device.id, tag)] = task
+            task.add_done_callback(lambda t: self._release(t, device.id, unclaimed))
+            tasks.add(task)
+
+        # Shielded: a cancelled caller must not abort a resolution others are waiting for
+        await asyncio.shield(asyncio.gather(*tasks))
+        return device.channel_id_by_tag
+
+    async def provision_missing(self, devices: Iterable[Device], concurrency: int) -> int:
+        """
+        Creates the missing model channels of the given devices, at most `concurrency`
+        devices at a time. Returns how many devices had missing channels.
+        """
+        pending = [d for d in devices if d.missing_channel_tags()]
+        if not pending:
+            return 0
+
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def provision(device: Device) -> None:
+            async with sem:
+                try:
+                    await self.resolve(device)
+                except Exception as e:
+                    # Left for the next reconciliation, or resolved lazily on fetch
+                    metrics.inc("channels.provision_failed")
+                    app_logger.warning(f"Could not provision channels for device id: {device.id}: {e}")
+
+        await asyncio.gather(*(provision(d) for d in pending))
+        return len(pending)
+
+    async def _provision(self, device: Device, tags: list[str]) -> None:
+        channels = await self.intab.list_logger_channels(device.id)
+        existing = {ch.get("tag"): ch.get("id") for ch in channels}
+        metrics.inc("channels.listed")
+
+        for tag in tags:
+            channel_id = existing.get(tag)
+            if channel_id is None:
+                channel = await self.intab.create_channel(device.id, tag)
+                channel_id = channel.id
+                metrics.inc("channels.created")
+                app_logger.info(f"Created channel {tag} ({channel_id}) for device id: {device.id}")
+            device.add_new_channel(channel_id, tag)  # Update Device state with the channel
+
+    def _release(self, task: asyncio.Task, logger_id: int, tags: list[str]) -> None:
+        for tag in tags:
+            if self._in_flight.get((logger_id, tag)) is task:
+                del self._in_flight[(logger_id, tag)]
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every waiter was cancelled
@@ -0,0 +1,42 @@
+from typing import Iterable, Optional
+
+
+SIGNAL_KEY = 0  # channel key for per-sample logger data (signal, battery); channel ids start at 1
+
+
+class SampleDedupe:
+    """
+    Per-device filter for samples that were already published.
+
+    watermark is the newest published sample time: anything older is a duplicate.
+    At the watermark itself only the published (ts, channel) keys are known, so a
+    channel that was missing from an earlier response can still come through.
+    """
+    watermark: int
+    _at_watermark: Optional[set[int]]  # channels published at watermark, None = all of them
+
+    def __init__(self, watermark: int) -> None:
+        # Everything up to the initial last_seen counts as published
+        self.watermark = watermark
+        self._at_watermark = None
+
+    def is_new(self, ts: int, channel_id: int) -> bool:
+        if ts != self.watermark:
+            return ts > self.watermark
+        return self._at_watermark is not None and channel_id not in self._at_watermark
+
+    def commit(self, keys: Iterable[tuple[int, int]]) -> None:
+        """
+        Records published (ts, channel) keys, moving the watermark to the newest ts.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        newest = max(ts for ts, _ in keys)
+        if newest < self.watermark:
+            return
+        if newest > self.watermark:
+            self.watermark = newest
+            self._at_watermark = set()
+        if self._at_watermark is not None:
+            self._at_watermark.update(ch for ts, ch in keys if ts == newest)
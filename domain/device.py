@@ -1,4 +1,5 @@
 from domain.schedule import ScheduleState
+from domain.dedupe import SampleDedupe
 
 from infra.logging_config import app_logger
 
@@ -24,6 +25,7 @@ class Device:
     channels: list[Channel]
     channel_id_by_tag: dict[str, int]
     schedule: ScheduleState
+    dedupe: SampleDedupe  # filters samples already published
 
     def __init__(
             self, 
@@ -43,6 +45,7 @@ class Device:
         self.model = model.upper()
         self.channels = channels
         self.schedule = schedule
+        self.dedupe = SampleDedupe(watermark=schedule.last_seen)
 
         channel_map = dict()
         for ch in channels:
@@ -57,10 +60,33 @@ class Device:
             return []
         return tags
     
+    def missing_channel_tags(self) -> list[str]:
+        """
+        Tags of the device's model that have no known channel id yet.
+        """
+        return [tag for tag in self.get_channel_tags() if tag not in self.channel_id_by_tag]
+
     def add_new_channel(self, channel_id: int, tag: str) -> None:
         channel = Channel(id=channel_id, tag=tag)
         self.channels.append(channel)
         self.channel_id_by_tag[tag] = channel_id
+
+    def update(self, model: str, lookup_id: int, channels: list[Channel]) -> None:
+        """
+        Applies a changed Intab record in place, keeping the schedule and dedupe state.
+        """
+        if not model.upper() in CHANNEL_TAGS_BY_MODEL:
+            raise ValueError(f"Unknown logger model: {model}")
+        self.model = model.upper()
+        self.lookup_id = lookup_id
+        self.update_channels(channels)
+
+    def update_channels(self, channels: list[Channel]) -> None:
+        """
+        Replaces the known channels with the ones Intab currently reports.
+        """
+        self.channels = list(channels)
+        self.channel_id_by_tag = {ch.tag: ch.id for ch in channels}
         
         
 
@@ -0,0 +1,50 @@
+import time
+
+from infra.rate_limit import RateLimiter
+
+
+class FetchPlanner:
+    """
+    Paces the scheduler's dispatches to the SDG rate budget.
+
+    Mirrors the limiter's token bucket (capacity and refill rate), scaled down by
+    `share` to leave room for retries and other SDG calls. Each dispatched fetch
+    takes a slot; when the budget is spent, due devices stay in the schedule queue,
+    which releases the most overdue first once new slots refill.
+    """
+    def __init__(self, limiter: RateLimiter, share: float = 0.9) -> None:
+        self.capacity = max(1, int(limiter.capacity * share))
+        self.refill_rate = limiter.refill_rate * share  # slots per second
+        self._slots = float(self.capacity)
+        self._last_refill = time.monotonic()
+
+    def budget(self) -> int:
+        """
+        Returns how many fetches may be dispatched right now.
+        """
+        now = time.monotonic()
+        self._slots = min(self.capacity, self._slots + (now - self._last_refill) * self.refill_rate)
+        self._last_refill = now
+        return int(self._slots)
+
+    def take(self, n: int) -> None:
+        self._slots -= n
+
+    def refund(self, n: int) -> None:
+        """
+        Returns slots for dispatches that turned out not to need a request.
+        """
+        self._slots = min(self.capacity, self._slots + n)
+
+    def next_slot_in(self) -> float:
+        """
+        Seconds until at least one more slot is available.
+        """
+        missing = 1 - self._slots
+        return max(0.0, missing / self.refill_rate)
+
+    def max_fleet(self, interval: int) -> int:
+        """
+        Number of devices the budget can poll once every `interval` seconds.
+        """
+        return int(self.refill_rate * interval)
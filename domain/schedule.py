@@ -1,7 +1,8 @@
 from typing import Optional
-from collections import deque
+from array import array
 from statistics import median, StatisticsError
 import asyncio
+import math
 
 from utils.time import ts_now, clamp
 from infra.logging_config import app_logger
@@ -12,63 +13,144 @@ MIN_TRANSMISSION_INTERVAL = 900
 POSTPONE = 60
 BACKOFF = 10
 LOGGER_TX_DELAY = 20
+TX_HISTORY_LEN = 20
+PERIOD_TOLERANCE = 0.05  # fitted periods may drift this far outside the min/max interval
 
 
 class ScheduleState:
     due_at: int     # unix timestamp
     last_seen: int  # unix timestamp, request history from this date
     interval: Optional[int]
-    tx_history: deque
-    generation: int  # bump when rescheduling: to ignore stale heap entries
+    tx_history: array  # transmission timestamps (int64), newest first, strictly decreasing
+    history_len: int   # tx_history keeps at most this many
     lock: asyncio.Lock
     errors: int
+    misses: int        # empty polls in a row, not counted as errors
+    polls: int
+    empty_polls: int
+    delivery_lag: Optional[int]  # seconds from newest sample to the poll that fetched it
+    postponed_until: Optional[int]  # set during an upstream-wide outage, not counted as an error
+    remote_latest: Optional[int]  # latest sample time reported by the device group probe
 
-    def __init__(self, last_seen: int, due_at: int | None = None, maxlen=5):
+    def __init__(self, last_seen: int, due_at: int | None = None, maxlen=TX_HISTORY_LEN):
         self.due_at = due_at if due_at is not None else ts_now()
         self.last_seen = last_seen
-        self.tx_history = deque(maxlen=maxlen)
-        self.generation = 0
+        self.interval = None
+        # A packed array rather than a deque: no int object per entry for a fleet's worth of
+        # histories, and checkpoints copy it without decoding
+        self.tx_history = array("q")
+        self.history_len = maxlen
         self.lock = asyncio.Lock()
         self.errors = 0
+        self.misses = 0
+        self.polls = 0
+        self.empty_polls = 0
+        self.delivery_lag = None
+        self.postponed_until = None
+        self.remote_latest = None
     
+    @property
+    def empty_poll_ratio(self) -> float:
+        return self.empty_polls / self.polls if self.polls else 0.0
+
     def add_successful_tx(self, ts: int):
-        self.tx_history.appendleft(ts)
+        if not self.tx_history or ts > self.tx_history[0]:
+            self.tx_history.insert(0, ts)
+            del self.tx_history[self.history_len:]
         self.errors = 0
 
     def inc_error(self):
         self.errors += 1
+
+    def postpone(self, until: int):
+        """
+        Holds off the next poll until the given unix timestamp without penalizing the device.
+        """
+        self.postponed_until = until
+
+    def record_poll(self, newest_ts: Optional[int]) -> bool:
+        """
+        Registers the outcome of a successful fetch, newest_ts being the latest sample time
+        (None if nothing was returned). Returns True if the device transmitted since the last poll.
+        An empty poll is a miss, not an error, and ends any error backoff just like new data.
+        """
+        self.polls += 1
+        self.errors = 0
+        if newest_ts is None or (self.tx_history and newest_ts <= self.tx_history[0]):
+            self.empty_polls += 1
+            self.misses += 1
+            return False
+
+        self.delivery_lag = ts_now() - newest_ts
+        self.misses = 0
+        self.add_successful_tx(newest_ts)
+        return True
     
     def _update_due_at(self):
+        now = ts_now()
+        if self.postponed_until is not None:
+            self.due_at = max(now, self.postponed_until)
+            self.postponed_until = None
+            return
+
         if self.errors > 0:
             delay = POSTPONE * (BACKOFF ** (self.errors - 1))
             delay = clamp(int(delay), lower=POSTPONE, upper=MAX_TRANSMISSION_INTERVAL)
-            self.due_at = ts_now() + delay + LOGGER_TX_DELAY
+            self.due_at = now + delay + LOGGER_TX_DELAY
             return
         
         # Not enough history to estimate an interval
         if len(self.tx_history) < 2:
             self.interval = MIN_TRANSMISSION_INTERVAL
-            self.due_at = ts_now() + self.interval + LOGGER_TX_DELAY
+            self.due_at = now + self.interval + LOGGER_TX_DELAY
             return
 
-        # More than 2 intervals: calc median
-        md = self._calc_median()
-        self.interval = clamp(md, MIN_TRANSMISSION_INTERVAL, MAX_TRANSMISSION_INTERVAL)
-        self.due_at = self.tx_history[0] + self.interval + LOGGER_TX_DELAY
-
-    def _calc_median(self):
-        deltas = []
-        length = len(self.tx_history)
-        for i in range(length):
-            if i < length-1:
-                ts1 = self.tx_history[i]
-                ts2 = self.tx_history[i+1]
-                d = ts1-ts2
-                deltas.append(d)
-        
+        period, anchor, spread = self._estimate_phase()
+        self.interval = round(period)
+
+        if self.misses == 1 and 3 * spread > LOGGER_TX_DELAY:
+            # Upload timing is noisy, so it may just be late: look again shortly before skipping a cycle
+            self.due_at = now + POSTPONE
+            return
+
+        # First predicted transmission after the newest one that we have not polled for yet
+        cycles = max(1, math.ceil((now - LOGGER_TX_DELAY - anchor + 1) / period))
+        self.due_at = math.ceil(anchor + cycles * period) + LOGGER_TX_DELAY
+
+    def _estimate_phase(self) -> tuple[float, float, float]:
+        """
+        Robust (Theil-Sen) fit of tx_history to t = anchor + n * period, where n is the
+        transmission cycle counted back from the newest transmission. Deltas spanning
+        missed uploads are mapped to several cycles, so they don't stretch the period.
+        Returns (period, anchor, spread): anchor is the fitted time of the newest transmission
+        and spread the median absolute deviation of transmissions from the fit.
+        """
+        txs = list(self.tx_history)
+        deltas = [a - b for a, b in zip(txs, txs[1:])]
+
+        # Missed uploads only ever lengthen a delta, so base the cycle count on the lower quartile
+        base = max(1, sorted(deltas)[len(deltas) // 4])
+        cycles = [0]
+        for d in deltas:
+            cycles.append(cycles[-1] - max(1, round(d / base)))
+
+        slopes = [
+            (txs[i] - txs[j]) / (cycles[i] - cycles[j])
+            for i in range(len(txs))
+            for j in range(i + 1, len(txs))
+        ]
         try:
-            md = int(median(deltas))
+            # Not rounded: a whole-second period is off by up to 1s per cycle, which
+            # shifts the fitted anchor by several seconds over a full history
+            period = clamp(
+                median(slopes),
+                lower=MIN_TRANSMISSION_INTERVAL * (1 - PERIOD_TOLERANCE),
+                upper=MAX_TRANSMISSION_INTERVAL * (1 + PERIOD_TOLERANCE),
+            )
         except StatisticsError:
-            md = MIN_TRANSMISSION_INTERVAL
-        
-        return md
+            period = MIN_TRANSMISSION_INTERVAL
+
+        intercepts = [t - n * period for t, n in zip(txs, cycles)]
+        anchor = median(intercepts)
+        spread = median(abs(i - anchor) for i in intercepts)
+        return period, anchor, spread
@@ -0,0 +1,108 @@
+import time
+from dataclasses import dataclass
+
+from infra.logging_config import app_logger
+from infra.metrics import metrics
+from utils.time import ts_now
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request while an upstream's circuit is open.
+    retry_at is the unix timestamp at which the circuit will let a probe through.
+    """
+    def __init__(self, name: str, retry_at: int) -> None:
+        super().__init__(f"Circuit for {name} is open until {retry_at}")
+        self.name = name
+        self.retry_at = retry_at
+
+
+@dataclass(frozen=True)
+class CircuitBreakerConfig:
+    failure_threshold: int = 5   # consecutive failed attempts before opening
+    open_s: float = 30.0         # fail fast this long before the first probe
+    max_open_s: float = 600.0    # cap for the doubling open time after failed probes
+    probe_timeout_s: float = 60.0  # a probe without outcome after this is considered lost
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker (closed -> open -> half-open -> closed).
+    While open every request fails fast; once the open time has passed a single
+    probe request is let through and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name: str, cfg: CircuitBreakerConfig = CircuitBreakerConfig()) -> None:
+        self.name = name
+        self.cfg = cfg
+        self.state = CLOSED
+        self._failures = 0
+        self._open_s = cfg.open_s
+        self._open_until = 0.0     # monotonic
+        self._probe_started = 0.0  # monotonic, 0 when no probe is in flight
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def retry_at(self) -> int:
+        """
+        Unix timestamp at which a request may be attempted again. While a probe is in
+        flight that is when its outcome is due, at the latest after another open period.
+        """
+        now = time.monotonic()
+        until = self._open_until
+        if self._probe_started and now >= until:
+            until = min(self._probe_started + self.cfg.probe_timeout_s, now + self._open_s)
+        return ts_now() + max(0, int(until - now) + 1)
+
+    def before_request(self) -> None:
+        """
+        Raises CircuitOpenError unless a request may be sent now.
+        """
+        if self.state == CLOSED:
+            return
+
+        now = time.monotonic()
+        if now < self._open_until:
+            raise CircuitOpenError(self.name, self.retry_at())
+
+        if self._probe_started and now - self._probe_started < self.cfg.probe_timeout_s:
+            # Someone else is probing: keep failing fast until it reports back
+            raise CircuitOpenError(self.name, self.retry_at())
+
+        self.state = HALF_OPEN
+        self._probe_started = now
+        app_logger.info(f"Circuit for {self.name} is half-open, probing")
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            app_logger.info(f"Circuit for {self.name} closed")
+            metrics.set(f"circuit.{self.name}.open", 0)
+        self.state = CLOSED
+        self._failures = 0
+        self._open_s = self.cfg.open_s
+        self._probe_started = 0.0
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            # Probe failed: open again for longer
+            self._open_s = min(self.cfg.max_open_s, self._open_s * 2)
+            self._open()
+            return
+
+        self._failures += 1
+        if self.state == CLOSED and self._failures >= self.cfg.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._probe_started = 0.0
+        self._open_until = time.monotonic() + self._open_s
+        metrics.inc(f"circuit.{self.name}.opened")
+        metrics.set(f"circuit.{self.name}.open", 1)
+        app_logger.warning(f"Circuit for {self.name} opened for {self._open_s:.0f}s")
@@ -0,0 +1,121 @@
+from typing import Generic, Hashable, Optional, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+class IndexedHeap(Generic[K]):
+    """
+    Binary min-heap of (priority, key) with one entry per key.
+    A position index allows updating or removing a key in place in O(log n),
+    so rescheduling never leaves stale entries behind.
+    """
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, K]] = []
+        self._pos: dict[K, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._pos
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._pos.clear()
+
+    def push(self, key: K, priority: int) -> None:
+        """
+        Inserts key, or moves it to the new priority if it is already queued.
+        """
+        i = self._pos.get(key)
+        if i is None:
+            self._heap.append((priority, key))
+            i = len(self._heap) - 1
+            self._pos[key] = i
+            self._sift_up(i)
+            return
+
+        old_priority = self._heap[i][0]
+        self._heap[i] = (priority, key)
+        if priority < old_priority:
+            self._sift_up(i)
+        elif priority > old_priority:
+            self._sift_down(i)
+
+    def remove(self, key: K) -> bool:
+        """
+        Removes key if queued. Returns True if it was found.
+        """
+        i = self._pos.pop(key, None)
+        if i is None:
+            return False
+
+        last = self._heap.pop()
+        if i < len(self._heap):
+            # Move the former last entry into the hole and restore heap order
+            self._heap[i] = last
+            self._pos[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self._pos[last[1]])
+        return True
+
+    def peek(self) -> Optional[tuple[int, K]]:
+        return self._heap[0] if self._heap else None
+
+    def pop_due(self, now: int, limit: int = 0) -> list[tuple[int, K]]:
+        """
+        Pops every entry with priority <= now (at most limit, if set), lowest first.
+        """
+        due: list[tuple[int, K]] = []
+        while self._heap and self._heap[0][0] <= now:
+            if limit and len(due) >= limit:
+                break
+            due.append(self.pop())
+        return due
+
+    def next_due(self) -> Optional[int]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop(self) -> tuple[int, K]:
+        """
+        Removes and returns the (priority, key) with the lowest priority.
+        Raises IndexError when empty.
+        """
+        if not self._heap:
+            raise IndexError("pop from empty IndexedHeap")
+        top = self._heap[0]
+        self.remove(top[1])
+        return top
+
+    def _sift_up(self, i: int) -> None:
+        heap, pos = self._heap, self._pos
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent] <= item:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][1]] = i
+            i = parent
+        heap[i] = item
+        pos[item[1]] = i
+
+    def _sift_down(self, i: int) -> None:
+        heap, pos = self._heap, self._pos
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            right = child + 1
+            if right < n and heap[right] < heap[child]:
+                child = right
+            if item <= heap[child]:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][1]] = i
+            i = child
+        heap[i] = item
+        pos[item[1]] = i
@@ -0,0 +1,50 @@
+from collections import defaultdict
+from typing import Any
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry: counters, gauges and simple
+    observations (count/sum/max). Snapshots are logged periodically by the bridge.
+    """
+    def __init__(self) -> None:
+        self.counters: dict[str, int] = defaultdict(int)
+        self.gauges: dict[str, float] = {}
+        self.observations: dict[str, list[float]] = {}  # name -> [count, sum, max]
+
+    def inc(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def set(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        obs = self.observations.get(name)
+        if obs is None:
+            self.observations[name] = [1, value, value]
+            return
+        obs[0] += 1
+        obs[1] += value
+        if value > obs[2]:
+            obs[2] = value
+
+    def snapshot(self, reset: bool = False) -> dict[str, Any]:
+        """
+        Returns a flat dict of all metrics. Observations are reported as
+        <name>.count, <name>.avg and <name>.max. With reset=True counters
+        and observations start over (gauges are kept).
+        """
+        snap: dict[str, Any] = dict(self.counters)
+        snap.update(self.gauges)
+        for name, (count, total, mx) in self.observations.items():
+            snap[f"{name}.count"] = count
+            snap[f"{name}.avg"] = round(total / count, 3) if count else 0
+            snap[f"{name}.max"] = round(mx, 3)
+
+        if reset:
+            self.counters.clear()
+            self.observations.clear()
+        return snap
+
+
+metrics = Metrics()
@@ -1,42 +1,112 @@
 import asyncio
 import time
+from collections import deque
+from enum import IntEnum
+from typing import Optional
 
 
 class RateLimiterConfig:
     def __init__(self, rate: int = 100, per: float = 60.0):
         self.rate = rate
         self.per = per
-        
+
+
+class Priority(IntEnum):
+    """
+    Waiter classes, served strictly in this order (FIFO within a class).
+    """
+    AUTH = 0        # token refresh / login
+    DISCOVERY = 1   # logger discovery and probes
+    DEFAULT = 2
+    BULK = 3        # sample fetches
+
 
 class RateLimiter:
+    """
+    Token bucket that parks waiters in per-priority FIFO queues and wakes them
+    exactly when enough tokens have refilled, instead of letting callers poll.
+    """
     def __init__(self, cfg: RateLimiterConfig):
         self.capacity = cfg.rate
-        self.tokens = cfg.rate
+        self.tokens = float(cfg.rate)
         self.refill_rate = cfg.rate / cfg.per # tokens per second
         self.last_refill = time.monotonic()
-        self._lock = asyncio.Lock()
+        self._waiters: list[deque[tuple[float, asyncio.Future]]] = [deque() for _ in Priority]
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def try_acquire(self, weight: float = 1) -> bool:
+        """
+        Takes weight tokens if available right now and nobody is queued ahead. Never waits.
+        """
+        if self._has_waiters():
+            return False
+        self._refill()
+        if self.tokens >= weight:
+            self.tokens -= weight
+            return True
+        return False
+
+    async def acquire(self, weight: float = 1, priority: Priority = Priority.DEFAULT) -> None:
+        """
+        Waits until weight tokens are granted. Waiters are served by priority,
+        then in arrival order; a heavy waiter at the head is not overtaken.
+        """
+        if weight > self.capacity:
+            raise ValueError(f"Cannot acquire {weight} tokens from a bucket of {self.capacity}")
+        if self.try_acquire(weight):
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (weight, fut)
+        self._waiters[priority].append(entry)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted just as we were cancelled: hand the tokens back
+                self.tokens = min(self.capacity, self.tokens + weight)
+            else:
+                try:
+                    self._waiters[priority].remove(entry)
+                except ValueError:
+                    pass
+            self._dispatch()
+            raise
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._waiters)
 
-    async def request_token(self) -> tuple[bool, float | None]:
+    def _has_waiters(self) -> bool:
+        return any(self._waiters)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.last_refill = now
+
+    def _dispatch(self) -> None:
         """
-        Returns:
-        (True, None) if allowed
-        (False, retry_after_seconds) if rejected
+        Grants tokens to queued waiters in order and arms a timer for the
+        moment the next head can be served.
         """
-        async with self._lock:
-            now = time.monotonic()
-            elapsed = now - self.last_refill
-
-            # Refill tokens
-            refill = elapsed * self.refill_rate
-            if refill > 0:
-                self.tokens = min(self.capacity, self.tokens + refill)
-                self.last_refill = now
-
-            if self.tokens >= 1:
-                self.tokens -= 1
-                return True, None
-
-            # Not enough tokens: calculate retry-after
-            missing = 1 - self.tokens
-            retry_after = missing / self.refill_rate
-            return False, retry_after
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._refill()
+        for queue in self._waiters:
+            while queue:
+                weight, fut = queue[0]
+                if fut.done():
+                    queue.popleft()  # cancelled while waiting
+                    continue
+                if self.tokens < weight:
+                    delay = (weight - self.tokens) / self.refill_rate
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                    return
+                self.tokens -= weight
+                queue.popleft()
+                fut.set_result(None)
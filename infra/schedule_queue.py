@@ -0,0 +1,29 @@
+from typing import Optional, Protocol
+
+from infra.indexed_heap import IndexedHeap
+from infra.timing_wheel import TimingWheel
+
+
+class ScheduleQueue(Protocol):
+    """
+    Deadline queue of logger ids used by the scheduler.
+    """
+    def __len__(self) -> int: ...
+    def __contains__(self, key: int) -> bool: ...
+    def clear(self) -> None: ...
+    def push(self, key: int, due_at: int) -> None: ...
+    def remove(self, key: int) -> bool: ...
+    def pop_due(self, now: int, limit: int = 0) -> list[tuple[int, int]]: ...
+    def next_due(self) -> Optional[int]: ...
+
+
+def build_schedule_queue(backend: str) -> ScheduleQueue:
+    """
+    Returns an empty scheduler backend: "heap" (indexed binary heap) or
+    "wheel" (hierarchical timing wheel).
+    """
+    if backend == "heap":
+        return IndexedHeap()
+    if backend == "wheel":
+        return TimingWheel()
+    raise ValueError(f"Unknown scheduler backend: {backend}")
@@ -0,0 +1,458 @@
+import asyncio
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from infra.logging_config import app_logger
+
+
+RECORD_HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+SEGMENT_SUFFIX = ".seg"
+
+FSYNC_ALWAYS = "always"      # every append is on disk before it returns
+FSYNC_INTERVAL = "interval"  # appends are fsynced in the background every fsync_interval_s
+FSYNC_NEVER = "never"        # left to the OS
+
+
+@dataclass(frozen=True)
+class SpoolConfig:
+    path: str
+    segment_max_bytes: int = 64 * 1024 * 1024
+    max_bytes: int = 1024 * 1024 * 1024  # appends wait for the publisher beyond this, 0 = unbounded
+    fsync: str = FSYNC_INTERVAL
+    fsync_interval_s: float = 1.0
+
+
+# Position in the spool: (segment id, byte offset)
+Position = tuple[int, int]
+
+
+class Spool:
+    """
+    Segmented on-disk write-ahead log of serialized records.
+
+    Records are appended to the newest segment and read back in order from the
+    committed cursor; ack() moves the cursor in memory, and sync_loop() saves it
+    and deletes fully consumed segments in the background. The saved cursor
+    survives restarts, so whatever was appended but not acked (or acked within
+    the last save interval) is replayed. A record torn by a crash is cut off on open.
+
+    The reader may plan() how it splits the records past the cursor into messages.
+    Planned boundaries are saved next to the cursor and come back on open, so a
+    replayed message covers the same records, and gets the same record_id().
+    """
+    def __init__(self, cfg: SpoolConfig) -> None:
+        if cfg.fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {cfg.fsync}")
+        self.cfg = cfg
+        self.spool_id = ""  # stable per spool directory, for idempotent publish ids
+        self.depth = 0           # records appended but not acked
+        self.pending_bytes = 0
+        self.acked_total = 0     # cumulative, read as deltas for the replay rate
+        self.appended = asyncio.Event()  # set on every append, cleared by the reader
+        self._space = asyncio.Event()    # set while below max_bytes
+        self._space.set()
+        self._segments: list[int] = []   # ids, oldest first
+        self._cursor: Position = (0, 0)
+        self._writer = None
+        self._write_offset = 0
+        self._dirty = False
+        self._sealing: list = []  # rolled segments' files, fsynced and closed by the next sync
+        self._sealed_sizes: dict[int, int] = {}  # segment id -> size, for segments no longer written
+        self._cursor_dirty = False
+        self._dead_segments: list[int] = []  # consumed, deleted once the cursor past them is saved
+        self._planned: deque[Position] = deque()  # ends of planned messages past the cursor, in order
+        self._plan_file = None
+        self._plan_lock = threading.Lock()  # plan appends vs. compaction, both in worker threads
+        self._sync_waiters: list[asyncio.Future] = []
+        self._sync_task: Optional[asyncio.Task] = None
+
+    def open(self) -> None:
+        """
+        Loads segments and the cursor, truncating a torn tail record. Blocking; call at startup.
+        """
+        os.makedirs(self.cfg.path, exist_ok=True)
+        self.spool_id = self._load_spool_id()
+        self._segments = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.cfg.path)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        self._cursor = self._load_cursor()
+
+        # Drop segments the cursor has already moved past
+        while self._segments and self._segments[0] < self._cursor[0]:
+            os.remove(self._segment_path(self._segments.pop(0)))
+        if not self._segments:
+            self._segments.append(max(1, self._cursor[0]))
+            self._cursor = (self._segments[0], 0)
+            open(self._segment_path(self._segments[0]), "ab").close()
+        elif self._cursor[0] < self._segments[0]:
+            self._cursor = (self._segments[0], 0)
+
+        # Count what is left to replay; the last segment may end in a torn record
+        self.depth = 0
+        self.pending_bytes = 0
+        for seg in self._segments:
+            start = self._cursor[1] if seg == self._cursor[0] else 0
+            records, end = self._scan(seg, start)
+            self.depth += records
+            self.pending_bytes += end - start
+            if end < os.path.getsize(self._segment_path(seg)):
+                app_logger.warning(f"Truncating torn spool record in segment {seg} at offset {end}")
+                os.truncate(self._segment_path(seg), end)
+
+        self._sealed_sizes = {seg: os.path.getsize(self._segment_path(seg)) for seg in self._segments[:-1]}
+        active = self._segments[-1]
+        self._writer = open(self._segment_path(active), "ab")
+        self._write_offset = self._writer.tell()
+        self._update_space()
+
+        # Boundaries beyond the intact records were planned for records lost in a crash
+        spool_end = (active, self._write_offset)
+        self._planned = deque(end for end in self._load_plan() if self._cursor < end <= spool_end)
+        self._compact_plan(self._cursor)
+        if self.depth:
+            app_logger.info(f"Spool has {self.depth} record(s) ({self.pending_bytes} bytes) to replay")
+
+    async def append(self, payload: bytes) -> None:
+        """
+        Appends one record. Returns once it is durable per the fsync policy; waits
+        while the spool is over max_bytes.
+        """
+        while not self._space.is_set():
+            await self._space.wait()
+
+        assert self._writer is not None
+        if self._write_offset >= self.cfg.segment_max_bytes:
+            await self._roll()
+
+        self._writer.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._writer.write(payload)
+        self._writer.flush()
+        size = RECORD_HEADER.size + len(payload)
+        self._write_offset += size
+        self.depth += 1
+        self.pending_bytes += size
+        self._dirty = True
+        self._update_space()
+        self.appended.set()
+
+        if self.cfg.fsync == FSYNC_ALWAYS:
+            await self.sync()
+
+    async def sync(self) -> None:
+        """
+        fsyncs the active segment. Concurrent callers share one fsync (group commit).
+        """
+        if self._writer is None:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._sync_waiters.append(fut)
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._run_syncs())
+        await fut
+
+    async def sync_loop(self, stop: asyncio.Event) -> None:
+        """
+        Background fsync for the interval policy, and coalesced cursor saves for every policy.
+        """
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.cfg.fsync_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                if self._dirty and self.cfg.fsync == FSYNC_INTERVAL:
+                    await self.sync()
+                await self.save_cursor()
+            except OSError as e:
+                app_logger.error(f"Spool background sync failed: {e}")
+
+    async def save_cursor(self) -> None:
+        """
+        Persists the cursor acked so far and deletes the segments it moved past, off the event loop.
+        """
+        if not self._cursor_dirty and not self._dead_segments:
+            return
+        self._cursor_dirty = False
+        dead, self._dead_segments = self._dead_segments, []
+        try:
+            await asyncio.to_thread(self._persist_cursor, self._cursor, dead)
+        except OSError:
+            self._cursor_dirty = True
+            self._dead_segments = dead + self._dead_segments
+            raise
+
+    def read(
+        self, max_records: int, start: Optional[Position] = None, until: Optional[Position] = None
+    ) -> tuple[list[bytes], Position]:
+        """
+        Returns up to max_records records from start (default the cursor) on, or with until
+        the records up to that position whatever their number, and the position after
+        them to ack once they have been handled. Does not move the cursor.
+        """
+        records: list[bytes] = []
+        seg, offset = start if start is not None else self._cursor
+        if until is not None:
+            max_records = 2 ** 62
+        incomplete = False
+        # A copy: ack() may drop segments meanwhile, but only ones before the cursor
+        for seg_id in list(self._segments):
+            if seg_id < seg:
+                continue
+            start = offset if seg_id == seg else 0
+            end = self._write_offset if seg_id == self._segments[-1] else None
+            with open(self._segment_path(seg_id), "rb") as f:
+                f.seek(start)
+                pos = start
+                while len(records) < max_records and (end is None or pos < end):
+                    if until is not None and (seg_id, pos) >= until:
+                        break
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        incomplete = True  # still being written
+                        break
+                    records.append(payload)
+                    pos += RECORD_HEADER.size + length
+            seg, offset = seg_id, pos
+            if incomplete or len(records) >= max_records or (until is not None and (seg, offset) >= until):
+                break
+        return records, (seg, offset)
+
+    def planned_end(self, start: Position) -> Optional[Position]:
+        """
+        Returns the end of the planned message starting at start, if there is one.
+        """
+        prev = self._cursor
+        for end in self._planned:
+            if prev == start:
+                return end
+            prev = end
+        return None
+
+    async def plan(self, end: Position) -> None:
+        """
+        Records that the next message ends at end: it starts at the previous planned
+        end, or at the cursor. Saved before it returns, so call it before publishing.
+        """
+        await asyncio.to_thread(self._append_plan, end)
+        self._planned.append(end)
+
+    def ack(self, position: Position, records: int) -> None:
+        """
+        Moves the cursor to position (from read()). Only updates memory: the cursor
+        is saved and fully consumed segments are deleted by save_cursor().
+        """
+        seg, offset = position
+        consumed = 0
+        cur_seg, cur_offset = self._cursor
+        for seg_id in list(self._segments):
+            if seg_id < cur_seg or seg_id > seg:
+                continue
+            start = cur_offset if seg_id == cur_seg else 0
+            if seg_id < seg:
+                consumed += self._sealed_sizes.pop(seg_id) - start
+                self._segments.remove(seg_id)
+                self._dead_segments.append(seg_id)
+            else:
+                consumed += offset - start
+
+        self._cursor = position
+        while self._planned and self._planned[0] <= position:
+            self._planned.popleft()
+        self.depth -= records
+        self.pending_bytes -= consumed
+        self.acked_total += records
+        self._cursor_dirty = True
+        self._update_space()
+
+    def record_id(self, start: Position, end: Position) -> str:
+        """
+        Stable id for the records between two positions, identical when they are replayed.
+        """
+        return f"{self.spool_id}:{start[0]}.{start[1]}-{end[0]}.{end[1]}"
+
+    @property
+    def cursor(self) -> Position:
+        return self._cursor
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._fsync_files(self._sealing, self._writer)
+            self._sealing = []
+            self._writer.close()
+            self._writer = None
+        self._persist_cursor(self._cursor, self._dead_segments)
+        self._dead_segments = []
+        self._cursor_dirty = False
+        with self._plan_lock:
+            if self._plan_file is not None:
+                self._plan_file.close()
+                self._plan_file = None
+
+    async def _run_syncs(self) -> None:
+        while self._sync_waiters:
+            waiters, self._sync_waiters = self._sync_waiters, []
+            self._dirty = False
+            sealing, self._sealing = self._sealing, []
+            try:
+                assert self._writer is not None
+                await asyncio.to_thread(self._fsync_files, sealing, self._writer)
+            except Exception as e:
+                self._sealing = [f for f in sealing if not f.closed] + self._sealing
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(None)
+
+    async def _roll(self) -> None:
+        """
+        Starts a new segment. The full one is fsynced and closed by the next sync, so
+        waiters on earlier appends to it are covered and the event loop never blocks on it.
+        """
+        assert self._writer is not None
+        old_id = self._segments[-1]
+        self._sealed_sizes[old_id] = self._write_offset
+        self._sealing.append(self._writer)
+        self._writer = open(self._segment_path(old_id + 1), "ab")
+        self._segments.append(old_id + 1)
+        self._write_offset = 0
+        await self.sync()
+
+    def _fsync_files(self, sealing: list, writer) -> None:
+        """
+        fsyncs and closes rolled segments, then fsyncs the active one. Blocking.
+        """
+        for f in sealing:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        if sealing:
+            self._fsync_dir()  # makes the new segments' directory entries durable
+        os.fsync(writer.fileno())
+
+    def _persist_cursor(self, cursor: Position, dead_segments: list[int]) -> None:
+        """
+        Saves the cursor, then deletes the segments before it. Blocking.
+        """
+        self._atomic_write(os.path.join(self.cfg.path, "cursor"), f"{cursor[0]} {cursor[1]}")
+        self._compact_plan(cursor)
+        for seg in dead_segments:
+            try:
+                os.remove(self._segment_path(seg))
+            except FileNotFoundError:
+                pass
+
+    def _scan(self, seg: int, start: int) -> tuple[int, int]:
+        """
+        Counts intact records from start; returns (records, offset after the last intact one).
+        """
+        records = 0
+        pos = start
+        with open(self._segment_path(seg), "rb") as f:
+            f.seek(start)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                records += 1
+                pos += RECORD_HEADER.size + length
+        return records, pos
+
+    def _update_space(self) -> None:
+        if self.cfg.max_bytes and self.pending_bytes >= self.cfg.max_bytes:
+            self._space.clear()
+        else:
+            self._space.set()
+
+    def _segment_path(self, seg: int) -> str:
+        return os.path.join(self.cfg.path, f"{seg:012d}{SEGMENT_SUFFIX}")
+
+    def _load_spool_id(self) -> str:
+        path = os.path.join(self.cfg.path, "spool_id")
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            spool_id = uuid.uuid4().hex
+            self._atomic_write(path, spool_id)
+            return spool_id
+
+    def _load_cursor(self) -> Position:
+        try:
+            with open(os.path.join(self.cfg.path, "cursor")) as f:
+                seg, offset = f.read().split()
+                return int(seg), int(offset)
+        except (FileNotFoundError, ValueError):
+            return (self._segments[0], 0) if self._segments else (1, 0)
+
+    def _load_plan(self) -> list[Position]:
+        ends: list[Position] = []
+        try:
+            with open(os.path.join(self.cfg.path, "plan")) as f:
+                for line in f:
+                    try:
+                        seg, offset = line.split()
+                        ends.append((int(seg), int(offset)))
+                    except ValueError:
+                        break  # torn by a crash mid-append
+        except FileNotFoundError:
+            pass
+        return ends
+
+    def _append_plan(self, end: Position) -> None:
+        with self._plan_lock:
+            assert self._plan_file is not None
+            self._plan_file.write(f"{end[0]} {end[1]}\n")
+            self._plan_file.flush()
+            if self.cfg.fsync != FSYNC_NEVER:
+                os.fsync(self._plan_file.fileno())
+
+    def _compact_plan(self, cursor: Position) -> None:
+        """
+        Rewrites the plan file without the boundaries the cursor has passed. Blocking.
+        """
+        path = os.path.join(self.cfg.path, "plan")
+        with self._plan_lock:
+            # Re-read under the lock: plans appended meanwhile must not be lost
+            ends = [end for end in self._load_plan() if end > cursor]
+            if self._plan_file is not None:
+                self._plan_file.close()
+            self._atomic_write(path, "".join(f"{seg} {offset}\n" for seg, offset in ends))
+            self._plan_file = open(path, "a")
+
+    def _atomic_write(self, path: str, content: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(content)
+            if self.cfg.fsync == FSYNC_ALWAYS:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _fsync_dir(self) -> None:
+        try:
+            fd = os.open(self.cfg.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
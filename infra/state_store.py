@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import time
+from array import array
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Sequence
+
+from infra.logging_config import app_logger
+
+
+SCHEMA_VERSION = 3
+CHUNK_DEVICES = 10_000  # devices per row of packed columns
+
+_INT_COLUMNS = ("ids", "last_seen", "due_at", "errors", "misses", "watermark", "tx_len")
+
+
+@dataclass(slots=True)
+class DeviceSnapshot:
+    id: int
+    last_seen: int
+    due_at: int
+    errors: int
+    misses: int
+    tx_history: Sequence[int]  # newest first; loaded as an array('q'), which costs no int objects
+    watermark: int             # dedupe high-water mark
+    channels: dict[str, int] | str  # tag -> channel id; loaded as JSON, see channel_id_by_tag()
+
+    def channel_id_by_tag(self) -> dict[str, int]:
+        """
+        The checkpointed channel map, decoded on first use: most restored devices never need it.
+        """
+        if isinstance(self.channels, str):
+            self.channels = json.loads(self.channels)
+        return self.channels
+
+
+class FleetSnapshot(Mapping[int, DeviceSnapshot]):
+    """
+    A loaded checkpoint by device id. Columns stay packed; each DeviceSnapshot is
+    built when it is looked up, so loading a large fleet creates no per-device objects.
+    """
+    def __init__(self, columns: dict[str, array], tx_history: array, channels: list[str]) -> None:
+        self._last_seen = columns["last_seen"]
+        self._due_at = columns["due_at"]
+        self._errors = columns["errors"]
+        self._misses = columns["misses"]
+        self._watermark = columns["watermark"]
+        self._tx_history = tx_history
+        self._tx_start = array("q", accumulate(columns["tx_len"], initial=0))
+        self._channels = channels
+        self._index = dict(zip(columns["ids"], range(len(columns["ids"]))))
+
+    def __getitem__(self, device_id: int) -> DeviceSnapshot:
+        i = self._index[device_id]
+        return DeviceSnapshot(
+            device_id, self._last_seen[i], self._due_at[i], self._errors[i], self._misses[i],
+            self._tx_history[self._tx_start[i]:self._tx_start[i + 1]], self._watermark[i], self._channels[i],
+        )
+
+    def get(self, device_id: int, default=None):
+        # Mapping.get goes through a try/except around __getitem__; this runs once per device at startup
+        return self[device_id] if device_id in self._index else default
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class StateStore:
+    """
+    Checkpoints device state to a local SQLite file for warm restarts.
+
+    Every save writes a complete snapshot to a temporary file, fsyncs it and
+    renames it over the previous one, so a crash mid-write leaves the last good
+    snapshot in place. Both calls block; run them off the event loop.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def save(self, devices: list[DeviceSnapshot]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            # Durability comes from the fsync + rename below, not from SQLite's journal
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # Columnar: a row holds CHUNK_DEVICES devices as packed int64 columns, their
+            # tx_histories back to back (tx_len entries each) and their channel maps as
+            # one line of JSON per device, so a load decodes a few rows instead of 100k
+            conn.execute(
+                "CREATE TABLE devices ("
+                " chunk INTEGER PRIMARY KEY, ids BLOB, last_seen BLOB, due_at BLOB, errors BLOB,"
+                " misses BLOB, watermark BLOB, tx_len BLOB, tx_history BLOB, channels TEXT)"
+            )
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany(
+                "INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (n, *self._pack(devices[start:start + CHUNK_DEVICES]))
+                    for n, start in enumerate(range(0, len(devices), CHUNK_DEVICES))
+                ),
+            )
+            conn.execute("INSERT INTO meta VALUES ('saved_at', ?)", (str(int(time.time())),))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._fsync_dir()
+
+    def load(self) -> Mapping[int, DeviceSnapshot]:
+        """
+        Returns the last checkpoint by device id, or nothing if there is no usable one.
+        """
+        if not os.path.exists(self.path):
+            return {}
+        columns = {name: array("q") for name in _INT_COLUMNS}
+        tx_history = array("q")
+        channels: list[str] = []
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version != SCHEMA_VERSION:
+                    app_logger.warning(f"Ignoring state snapshot with schema version {version}")
+                    return {}
+                for row in conn.execute(
+                    f"SELECT {', '.join(_INT_COLUMNS)}, tx_history, channels FROM devices ORDER BY chunk"
+                ):
+                    for column, blob in zip(columns.values(), row):
+                        column.frombytes(blob)
+                    tx_history.frombytes(row[-2])
+                    channels.extend(row[-1].split("\n"))
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError) as e:
+            app_logger.error(f"Could not read state snapshot {self.path}: {e}")
+            return {}
+
+        count = len(columns["ids"])
+        if any(len(c) != count for c in columns.values()) or len(channels) != count \
+                or sum(columns["tx_len"]) != len(tx_history):
+            app_logger.error(f"Ignoring inconsistent state snapshot {self.path}")
+            return {}
+        return FleetSnapshot(columns, tx_history, channels)
+
+    def _pack(self, devices: list[DeviceSnapshot]) -> tuple:
+        columns = {name: array("q") for name in _INT_COLUMNS}
+        tx_history = array("q")
+        for d in devices:
+            columns["ids"].append(d.id)
+            columns["last_seen"].append(d.last_seen)
+            columns["due_at"].append(d.due_at)
+            columns["errors"].append(d.errors)
+            columns["misses"].append(d.misses)
+            columns["watermark"].append(d.watermark)
+            columns["tx_len"].append(len(d.tx_history))
+            tx_history.extend(d.tx_history)
+        # json.dumps never emits a raw newline, so lines split back into one map per device
+        channels = "\n".join(d.channels if isinstance(d.channels, str) else json.dumps(d.channels) for d in devices)
+        return (*(c.tobytes() for c in columns.values()), tx_history.tobytes(), channels)
+
+    def _fsync_dir(self) -> None:
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return  # e.g. not supported on this platform
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
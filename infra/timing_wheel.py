@@ -0,0 +1,149 @@
+from typing import Generic, Hashable, Optional, TypeVar
+
+from utils.time import ts_now
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimingWheel(Generic[K]):
+    """
+    Hierarchical timing wheel with 1-second resolution.
+
+    Level l has `slots` buckets of slots**l seconds each, so with the defaults
+    (64 slots, 3 levels) level 0 covers about a minute, level 1 about an hour
+    and level 2 about three days; later deadlines wait in an overflow bucket.
+    Insert, reschedule and cancel are O(1). Entries cascade to finer levels as
+    the cursor passes bucket boundaries during pop_due().
+    """
+    def __init__(self, slots: int = 64, levels: int = 3, start: Optional[int] = None) -> None:
+        self._slots = slots
+        self._levels = levels
+        self._granularity = [slots ** l for l in range(levels + 1)]
+        self._wheels: list[list[dict[K, int]]] = [
+            [dict() for _ in range(slots)] for _ in range(levels)
+        ]
+        self._ready: dict[K, int] = {}     # swept or already overdue, in sweep order
+        self._overflow: dict[K, int] = {}  # beyond the top level's span
+        self._where: dict[K, dict[K, int]] = {}  # key -> bucket holding it
+        self._cursor = start if start is not None else ts_now()  # first second not yet swept
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._where
+
+    def clear(self) -> None:
+        for wheel in self._wheels:
+            for bucket in wheel:
+                bucket.clear()
+        self._ready.clear()
+        self._overflow.clear()
+        self._where.clear()
+
+    def push(self, key: K, due_at: int) -> None:
+        """
+        Inserts key, or moves it to the new deadline if it is already queued.
+        """
+        bucket = self._where.get(key)
+        if bucket is not None:
+            del bucket[key]
+        self._place(key, due_at)
+
+    def remove(self, key: K) -> bool:
+        bucket = self._where.pop(key, None)
+        if bucket is None:
+            return False
+        del bucket[key]
+        return True
+
+    def pop_due(self, now: int, limit: int = 0) -> list[tuple[int, K]]:
+        """
+        Advances the wheel to now and pops every due entry (at most limit, if set).
+        Entries are returned in sweep order, i.e. by second, not strictly by deadline.
+        """
+        self._advance(now)
+
+        due: list[tuple[int, K]] = []
+        for key, due_at in self._ready.items():
+            if limit and len(due) >= limit:
+                break
+            due.append((due_at, key))
+        for _, key in due:
+            del self._ready[key]
+            del self._where[key]
+        return due
+
+    def next_due(self) -> Optional[int]:
+        """
+        Returns the next deadline, exact within the current level-0 span and a
+        lower bound (the start of the next non-empty bucket) beyond it. If swept
+        entries are still waiting, returns a time that has already passed.
+        """
+        if not self._where:
+            return None
+        if self._ready:
+            return self._cursor - 1
+
+        for level in range(self._levels):
+            g = self._granularity[level]
+            epoch_start = self._cursor - self._cursor % self._granularity[level + 1]
+            cur = (self._cursor // g) % self._slots
+            for idx in range(cur, self._slots):
+                if self._wheels[level][idx]:
+                    return max(self._cursor, epoch_start + idx * g)
+
+        return min(self._overflow.values())
+
+    def _place(self, key: K, due_at: int) -> None:
+        c = self._cursor
+        if due_at < c:
+            bucket = self._ready
+        else:
+            bucket = self._overflow
+            for level in range(self._levels):
+                g_next = self._granularity[level + 1]
+                if due_at // g_next == c // g_next:
+                    idx = (due_at // self._granularity[level]) % self._slots
+                    bucket = self._wheels[level][idx]
+                    break
+        bucket[key] = due_at
+        self._where[key] = bucket
+
+    def _advance(self, now: int) -> None:
+        if len(self._ready) == len(self._where):
+            # Nothing scheduled ahead: jump straight to now
+            self._cursor = max(self._cursor, now + 1)
+            return
+
+        while self._cursor <= now:
+            t = self._cursor
+            bucket = self._wheels[0][t % self._slots]
+            for key, due_at in bucket.items():
+                self._ready[key] = due_at
+                self._where[key] = self._ready
+            bucket.clear()
+            self._cursor = t + 1
+            self._cascade()
+
+    def _cascade(self) -> None:
+        """
+        Moves entries of coarser buckets whose span starts at the cursor down
+        to finer levels, top level first.
+        """
+        t = self._cursor
+        if t % self._granularity[self._levels] == 0 and self._overflow:
+            self._replace(self._overflow)
+        for level in range(self._levels - 1, 0, -1):
+            g = self._granularity[level]
+            if t % g == 0:
+                bucket = self._wheels[level][(t // g) % self._slots]
+                if bucket:
+                    self._replace(bucket)
+
+    def _replace(self, bucket: dict[K, int]) -> None:
+        entries = list(bucket.items())
+        bucket.clear()
+        for key, due_at in entries:
+            self._place(key, due_at)
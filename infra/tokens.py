@@ -5,7 +5,12 @@ from httpx import AsyncClient
 import jwt
 
 from utils.time import ts_now
+from infra.rate_limit import RateLimiter, Priority
 from infra.logging_config import app_logger
+from infra.metrics import metrics
+
+
+EXPIRY_MARGIN_S = 5  # never hand out a token this close to expiry
 
 
 class TokenConfig:
@@ -16,52 +21,133 @@ class TokenConfig:
             password: str,
             login_url: str,
             grace_period: int = 60,
-            default_exp: int = 600
+            default_exp: int = 600,
+            login_max_attempts: int = 5,
+            login_backoff_s: float = 1.0,
+            login_backoff_max_s: float = 60.0,
+            min_refresh_interval_s: float = 10.0,
     ) -> None:
         
         self.user_key = user_key
         self.username = username
         self.password = password
         self.login_url = login_url
-        self.grace_period = grace_period
+        self.grace_period = grace_period  # background refresh starts this long before expiry
         self.default_exp = default_exp
+        self.login_max_attempts = login_max_attempts
+        self.login_backoff_s = login_backoff_s
+        self.login_backoff_max_s = login_backoff_max_s
+        self.min_refresh_interval_s = min_refresh_interval_s  # background refreshes never come closer than this
         # self.use_refresh_token: bool  - implement later
         # self.refresh_url: str  - implement later
 
 
 class TokenProvider:
-    def __init__(self, cfg: TokenConfig, http_client: AsyncClient) -> None:
+    def __init__(
+            self,
+            cfg: TokenConfig,
+            http_client: AsyncClient,
+            rate_limiter: Optional[RateLimiter] = None,
+            name: str = "auth",
+    ) -> None:
         self.cfg = cfg
+        self.name = name  # metrics prefix
+        self._rate_limiter = rate_limiter  # logins are charged to the upstream's budget, ahead of other requests
         self._token: Optional[str] = None
         self._expires_at_ts: float = 0.0  # unix timestamp as float
+        self._refreshed_at_ts: float = 0.0  # when the current token was obtained
         self._lock = asyncio.Lock()
         self._http_client = http_client
 
     async def ensure_token(self) -> str:
+        """
+        Returns the cached token. Only logs in inline when there is no usable token,
+        i.e. before the first refresh or if background refresh has been failing.
+        """
         # Fast path
-        now = ts_now()
-        if self._token and now < (self._expires_at_ts - 60):  # refresh 60s early
+        if self._is_valid(EXPIRY_MARGIN_S):
+            assert self._token is not None
             return self._token
 
         # Single-flight refresh
         async with self._lock:
-            now = ts_now()
-            if self._token and now < (self._expires_at_ts - 60):
+            if self._is_valid(EXPIRY_MARGIN_S):
+                assert self._token is not None
                 return self._token
+            return await self._refresh()
 
-            token, _expires_at_ts = await self._login()
-            self._token = token
-            self._expires_at_ts = _expires_at_ts
-            return self._token
+    async def refresh_after_unauthorized(self, rejected_token: Optional[str]) -> str:
+        """
+        Called when the upstream answered 401 to rejected_token. Logs in again once,
+        however many requests were rejected with the same token at the same time.
+        """
+        async with self._lock:
+            if self._token is not None and self._token != rejected_token and self._is_valid(EXPIRY_MARGIN_S):
+                return self._token  # someone else already refreshed
+            metrics.inc(f"auth.{self.name}.unauthorized")
+            self._token = None
+            self._expires_at_ts = 0.0
+            return await self._refresh()
+
+    async def refresh_loop(self) -> None:
+        """
+        Renews the token shortly before it expires, so requests never wait on login:
+        grace_period seconds ahead, or half the token's lifetime if that is shorter.
+        Successful refreshes are at least min_refresh_interval_s apart, so a token that
+        comes back already (nearly) expired cannot make it log in back to back.
+        """
+        while True:
+            now = ts_now()
+            delay = max(
+                self._expires_at_ts - self._refresh_grace() - now,
+                self._refreshed_at_ts + self.cfg.min_refresh_interval_s - now,
+            )
+            if self._token and delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                async with self._lock:
+                    if not self._is_valid(self._refresh_grace()):
+                        await self._refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # _login gave up after its bounded retries, try again later
+                app_logger.error(f"Background token refresh for {self.cfg.login_url} failed: {e}")
+                await asyncio.sleep(self.cfg.login_backoff_max_s)
 
     async def invalidate(self) -> None:
         async with self._lock:
             self._token = None
             self._expires_at_ts = 0.0
 
-    async def _login(self, retry_after: int = 10) -> Tuple[str, float]:
-        while True:  # never back off or quit trying
+    def _refresh_grace(self) -> float:
+        lifetime = self._expires_at_ts - self._refreshed_at_ts
+        return max(0.0, min(self.cfg.grace_period, lifetime / 2))
+
+    def _is_valid(self, margin: float) -> bool:
+        return self._token is not None and ts_now() < self._expires_at_ts - margin
+
+    async def _refresh(self) -> str:
+        """
+        Must be called with _lock held.
+        """
+        token, expires_at_ts = await self._login()
+        self._token = token
+        self._expires_at_ts = expires_at_ts
+        self._refreshed_at_ts = ts_now()
+        metrics.set(f"auth.{self.name}.expires_in_s", int(expires_at_ts - ts_now()))
+        return token
+
+    async def _login(self) -> Tuple[str, float]:
+        """
+        Logs in with bounded exponential backoff. Raises the last error once
+        login_max_attempts attempts have failed.
+        """
+        delay = self.cfg.login_backoff_s
+        for attempt in range(1, self.cfg.login_max_attempts + 1):
             try:
+                if self._rate_limiter is not None:
+                    await self._rate_limiter.acquire(priority=Priority.AUTH)
                 app_logger.debug(f"Posting a login request to: {self.cfg.login_url}")
                 r = await self._http_client.post(
                     self.cfg.login_url,
@@ -77,13 +163,22 @@ class TokenProvider:
                 if not exp_ts:
                     exp_ts = ts_now() + self.cfg.default_exp
                 
-                app_logger.debug(f"Logged in and recieved token: {token}, and extracted expiration time: {exp_ts}")
+                app_logger.debug(f"Logged in to: {self.cfg.login_url}, token expires at: {exp_ts}")
+                metrics.inc(f"auth.{self.name}.logins")
 
                 return token, float(exp_ts)
             
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                app_logger.error(f"Error at login attempt to: {self.cfg.login_url}, error: {e}")
-                await asyncio.sleep(retry_after)
+                metrics.inc(f"auth.{self.name}.login_failures")
+                app_logger.error(f"Error at login attempt {attempt} to: {self.cfg.login_url}, error: {e}")
+                if attempt >= self.cfg.login_max_attempts:
+                    raise
+                await asyncio.sleep(delay)
+                delay = min(self.cfg.login_backoff_max_s, delay * 2)
+
+        raise RuntimeError("Login attempts exhausted")  # unreachable: max_attempts >= 1
 
     def _extract_exp_time(self, token) -> Optional[int]:
         try:
@@ -0,0 +1,87 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from infra.logging_config import app_logger
+
+
+@dataclass(frozen=True)
+class WorkerPoolConfig:
+    initial: int = 10
+    min_workers: int = 2
+    max_workers: int = 40
+    interval_s: float = 15.0
+    grow_step: int = 2
+    lag_high_s: float = 5.0         # queue wait above this means too few workers
+    lag_low_s: float = 0.5          # queue wait below this (and an empty queue) means too many
+    starvation_ratio: float = 0.5   # share of worker time spent waiting on the rate limiter
+
+
+@dataclass(frozen=True)
+class PoolSignals:
+    queue_wait_s: float    # average work queue wait over the last interval
+    queue_depth: int
+    throttled: int         # 429 / Retry-After responses over the last interval
+    rl_wait_s: float       # total time workers waited on the rate limiter over the last interval
+
+
+class AdaptiveWorkerPool:
+    """
+    Pool of worker tasks whose size follows the observed bottleneck:
+    grows while items wait in the queue and the rate limiter isn't the constraint,
+    shrinks (multiplicatively) on throttling or limiter starvation and (by one)
+    when idle. Workers get a retire event and exit after their current item.
+    """
+    def __init__(self, cfg: WorkerPoolConfig, spawn: Callable[[asyncio.Event], Awaitable[None]]) -> None:
+        self.cfg = cfg
+        self._spawn = spawn
+        self._workers: list[tuple[asyncio.Task, asyncio.Event]] = []
+        self._retired: list[asyncio.Task] = []  # finishing their current item
+        self.resize(cfg.initial)
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def resize(self, n: int) -> None:
+        n = max(self.cfg.min_workers, min(self.cfg.max_workers, n))
+        # Forget workers that have exited
+        self._workers = [(t, r) for t, r in self._workers if not t.done()]
+        self._retired = [t for t in self._retired if not t.done()]
+
+        while len(self._workers) < n:
+            retire = asyncio.Event()
+            self._workers.append((asyncio.create_task(self._spawn(retire)), retire))
+        while len(self._workers) > n:
+            task, retire = self._workers.pop()
+            retire.set()
+            self._retired.append(task)
+
+    def autoscale(self, signals: PoolSignals) -> int:
+        """
+        Resizes the pool based on the last interval's signals. Returns the new size.
+        """
+        size = self.size
+        starved = signals.rl_wait_s > self.cfg.starvation_ratio * size * self.cfg.interval_s
+
+        if signals.throttled or starved:
+            target = size - max(1, size // 4)
+        elif signals.queue_wait_s > self.cfg.lag_high_s and signals.queue_depth > 0:
+            target = size + self.cfg.grow_step
+        elif signals.queue_wait_s < self.cfg.lag_low_s and signals.queue_depth == 0:
+            target = size - 1
+        else:
+            target = size
+
+        self.resize(target)
+        if self.size != size:
+            app_logger.info(f"Worker pool resized from {size} to {self.size} ({signals})")
+        return self.size
+
+    async def close(self) -> None:
+        tasks = [t for t, _ in self._workers] + self._retired
+        self._workers.clear()
+        self._retired.clear()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
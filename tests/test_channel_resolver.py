@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app import AppConfig, Brigde
+from domain.channel_resolver import ChannelResolver
+from domain.device import Channel
+from utils.time import ts_now, ts_to_isostr
+
+
+class FakeSDG:
+    """
+    Yields n samples, newest first, 10s apart.
+    """
+    def __init__(self, n: int) -> None:
+        self.n = n
+
+    async def iter_samples(self, lookup_id: int, since: int, until=None):
+        newest = until or ts_now()
+        for i in range(self.n):
+            yield {"Time": ts_to_isostr(newest - i * 10), "CO2": 400, "Humidity": 40.0, "Temperature": 21.0}
+
+
+class FakeIntab:
+    """
+    Counts channel listings and creates; knows the channels in `existing`.
+    """
+    def __init__(self, existing: dict[str, int]) -> None:
+        self.existing = dict(existing)
+        self.lists = 0
+        self.creates = 0
+
+    async def list_logger_channels(self, logger_id: int) -> list:
+        self.lists += 1
+        await asyncio.sleep(0)
+        return [{"id": channel_id, "tag": tag} for tag, channel_id in self.existing.items()]
+
+    async def create_channel(self, logger_id: int, tag: str) -> Channel:
+        self.creates += 1
+        await asyncio.sleep(0)
+        self.existing[tag] = 100 + len(self.existing)
+        return Channel(id=self.existing[tag], tag=tag)
+
+
+async def _fetch_new_device(samples: int) -> tuple[FakeIntab, int]:
+    bridge = Brigde(AppConfig())
+    try:
+        bridge.sdg = FakeSDG(samples)
+        intab = FakeIntab(existing={"CO2": 1})
+        bridge.channels = ChannelResolver(intab)
+
+        now = ts_now()
+        device = bridge._initiate_logger(
+            {"id": 1, "tag": "IOTSU_N3_AQ05", "serial_number": 101, "channels": [], "last_seen": now - 86400}, now
+        )
+        lb = await bridge._fetch_batch(device, since=now - 86400)
+        return intab, len(lb.samples)
+    finally:
+        await bridge.stop()
+
+
+@pytest.mark.parametrize("samples", [1, 500, 5000])
+def test_intab_calls_do_not_grow_with_sample_count(samples):
+    intab, fetched = asyncio.run(_fetch_new_device(samples))
+
+    assert fetched == samples * 3
+    # One listing for the device, one create per tag Intab doesn't have yet (Humidity, Temperature)
+    assert intab.lists == 1
+    assert intab.creates == 2
+
+
+def test_concurrent_resolves_share_one_provisioning():
+    async def run():
+        intab = FakeIntab(existing={})
+        resolver = ChannelResolver(intab)
+        bridge = Brigde(AppConfig())
+        try:
+            device = bridge._initiate_logger(
+                {"id": 2, "tag": "IOTSU_N3_RHTEMP", "serial_number": 102, "channels": []}, ts_now()
+            )
+            maps = await asyncio.gather(*(resolver.resolve(device) for _ in range(20)))
+        finally:
+            await bridge.stop()
+        return intab, maps
+
+    intab, maps = asyncio.run(run())
+
+    assert intab.lists == 1
+    assert intab.creates == 2
+    assert all(m == {"Humidity": 100, "Temperature": 101} for m in maps)
@@ -0,0 +1,109 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator
+
+try:
+    import ijson  # optional: faster incremental parsing with its C (yajl2_c) backend
+except ImportError:
+    ijson = None
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r,]*")
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the items of a top-level JSON array as its bytes arrive, holding only
+    the unparsed tail of the body in memory. Uses ijson when installed, otherwise
+    splits items with the stdlib decoder.
+    """
+    if ijson is not None:
+        async for item in ijson.items(_AsyncReader(chunks), "item", use_float=True):
+            yield item
+        return
+
+    splitter = _ArraySplitter()
+    async for chunk in chunks:
+        for item in splitter.feed(chunk):
+            yield item
+    for item in splitter.feed(b"", final=True):
+        yield item
+
+
+class _ArraySplitter:
+    """
+    Incremental splitter for a top-level JSON array using the stdlib decoder.
+    Only the unparsed tail of the body is buffered.
+    """
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._started = False
+        self._done = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> list[Any]:
+        self._buf += self._utf8.decode(chunk, final=final)
+        buf = self._buf
+        pos = 0
+        items = []
+
+        while not self._done:
+            pos = (_SEPARATOR if self._started else _WHITESPACE).match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if not self._started:
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                self._started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                self._done = True
+                break
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise ValueError("Truncated JSON array")
+                break  # item not complete yet, wait for more bytes
+            # Only accept an item once its delimiter has arrived: a number cut
+            # at a chunk boundary would otherwise decode as a shorter one
+            after = _WHITESPACE.match(buf, end).end()
+            if after >= len(buf):
+                if final:
+                    raise ValueError("Truncated JSON array")
+                break
+            if buf[after] not in ",]":
+                if not final and after == end and buf[after] in _NUMBER_CHARS:
+                    break  # e.g. "3." of "3.5": wait for the rest of the number
+                raise ValueError(f"Unexpected {buf[after]!r} in JSON array")
+            pos = after
+            items.append(item)
+
+        self._buf = buf[pos:]
+        if final and not self._done and (self._started or self._buf.strip()):
+            raise ValueError("Truncated JSON array")
+        return items
+
+
+class _AsyncReader:
+    """
+    Adapts an async byte iterator to the async file interface ijson expects.
+    """
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks.__aiter__()
+
+    async def read(self, n: int = -1) -> bytes:
+        if n == 0:
+            return b""  # ijson probes the stream type with read(0): don't consume a chunk
+        try:
+            chunk = b""
+            while not chunk:  # an empty chunk would read as end of body
+                chunk = await self._chunks.__anext__()
+            return chunk
+        except StopAsyncIteration:
+            return b""